@@ -1,12 +1,10 @@
 import streamlit as st
 from story_generator import StoryGenerator
-import time
+from quantization import PRECISIONS
+from benchmark import load_results, summarize
+from decoding import DecodingPolicy
+from evaluation import evaluate
 import pandas as pd
-from nltk.translate.bleu_score import sentence_bleu
-from rouge import Rouge
-import nltk
-from nltk.tokenize import word_tokenize
-nltk.download('punkt_tab')
 
 # Set page config
 st.set_page_config(
@@ -15,12 +13,21 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize the story generator
-@st.cache_resource
-def load_generator():
-    return StoryGenerator()
+# Initialize the story generator; only one precision stays cached, so switching
+# precision releases the previous generator's models instead of keeping both
+@st.cache_resource(max_entries=1)
+def load_generator(precision='fp32'):
+    # Models load on first use; GPT-2 (the default selection) warms up in the background
+    return StoryGenerator(max_resident_models=2, idle_timeout=1800, warmup=('gpt2',), precision=precision)
 
-generator = load_generator()
+precision = st.sidebar.selectbox(
+    "Inference Precision",
+    PRECISIONS,
+    help="int8 and bf16 trade a little quality for faster CPU generation and less memory"
+)
+generator = load_generator(precision)
+if generator.precision != precision:
+    st.sidebar.warning(f"{precision} is not supported on this device; running {generator.precision}")
 
 # Sidebar navigation
 st.sidebar.title("Navigation")
@@ -78,6 +85,65 @@ if page == "Story Generator":
         help="Maximum length of the generated story"
     )
 
+    # GPT-2 can verify distilgpt2 drafts instead of decoding token by token
+    speculative = False
+    if model_name == "gpt2":
+        speculative = st.sidebar.checkbox(
+            "Speculative Decoding",
+            help="distilgpt2 drafts a few tokens and GPT-2 checks them in one pass; "
+                 "same output distribution, usually faster, but not streamed"
+        )
+
+    # Cost controls for the encoder-decoder models
+    policy = None
+    if model_name in ("flan-t5", "bart"):
+        st.sidebar.subheader("Decoding Policy")
+        num_beams = st.sidebar.slider(
+            "Beam Width",
+            min_value=1,
+            max_value=6,
+            value=1,
+            help="1 samples and streams the story; more beams run beam search (each beam costs a decoder pass per token)"
+        )
+        max_new_tokens = st.sidebar.slider(
+            "Token Budget",
+            min_value=0,
+            max_value=512,
+            value=0,
+            step=32,
+            help="Maximum number of tokens to generate (0 uses Max Length)"
+        )
+        max_time = st.sidebar.slider(
+            "Time Budget (seconds)",
+            min_value=5,
+            max_value=120,
+            value=30,
+            step=5,
+            help="Stop when the time is up and return the best story so far"
+        )
+        length_penalty = st.sidebar.slider(
+            "Length Penalty",
+            min_value=0.5,
+            max_value=2.0,
+            value=1.0,
+            step=0.1,
+            help="Above 1 favours longer beams, below 1 shorter ones (beam search only)"
+        )
+        no_repeat_ngram_size = st.sidebar.slider(
+            "No-Repeat N-gram Size",
+            min_value=0,
+            max_value=5,
+            value=3,
+            help="Never repeat an n-gram of this size (0 disables)"
+        )
+        policy = DecodingPolicy(
+            num_beams=num_beams,
+            max_new_tokens=max_new_tokens or None,
+            max_time=max_time,
+            length_penalty=length_penalty,
+            no_repeat_ngram_size=no_repeat_ngram_size
+        )
+
     # Main content area
     st.subheader("Story Prompt")
     prompt = st.text_area(
@@ -89,27 +155,57 @@ if page == "Story Generator":
     # Generate button
     if st.button("Generate Story", type="primary"):
         if prompt:
-            with st.spinner("Generating your story..."):
-                # Add a small delay to show the spinner
-                time.sleep(0.5)
-                
-                # Generate the story
-                story = generator.generate_story(
+            st.subheader("Generated Story")
+            story_placeholder = st.empty()
+            story_placeholder.caption("Generating your story...")
+
+            if speculative:
+                with st.spinner("Generating with speculative decoding..."):
+                    story = generator.generate_story(
+                        prompt=prompt,
+                        model_name=model_name,
+                        max_length=max_length,
+                        temperature=temperature,
+                        top_k=top_k,
+                        top_p=top_p,
+                        speculative=True
+                    )
+            elif policy is not None and policy.num_beams > 1:
+                # Beam search keeps several hypotheses, so there is nothing to stream
+                with st.spinner("Running beam search..."):
+                    story = generator.generate_story(
+                        prompt=prompt,
+                        model_name=model_name,
+                        max_length=max_length,
+                        temperature=temperature,
+                        top_k=top_k,
+                        top_p=top_p,
+                        policy=policy
+                    )
+            else:
+                # Stream the story as it is generated
+                story = ""
+                for piece in generator.generate_story_stream(
                     prompt=prompt,
                     model_name=model_name,
                     max_length=max_length,
                     temperature=temperature,
                     top_k=top_k,
-                    top_p=top_p
-                )
-                
-                # Display the generated story
-                st.subheader("Generated Story")
-                st.write(story)
-                
-                # Add word count
-                word_count = len(story.split())
-                st.caption(f"Word count: {word_count}")
+                    top_p=top_p,
+                    policy=policy
+                ):
+                    story += piece
+                    story_placeholder.write(story)
+                story = story.strip()
+            story_placeholder.write(story)
+
+            # Add word count
+            word_count = len(story.split())
+            st.caption(f"Word count: {word_count}")
+            if speculative:
+                report = generator.speculation_report()
+                st.caption(f"Draft acceptance rate: {report['acceptance_rate']:.0%}, "
+                           f"{report['tokens_per_target_pass']:.2f} tokens per GPT-2 pass (all runs so far)")
         else:
             st.warning("Please enter a prompt to generate a story.")
 
@@ -141,9 +237,7 @@ elif page == "Model Comparison":
             'General story generation',
             'Structured story generation',
             'Stories with clear structure'
-        ],
-        'Generation Speed': ['Fast', 'Medium', 'Medium'],
-        'Memory Usage': ['Low', 'Medium', 'Medium']
+        ]
     }
     
     # Create DataFrame
@@ -152,6 +246,29 @@ elif page == "Model Comparison":
     # Display comparison table
     st.subheader("Model Specifications")
     st.dataframe(df, use_container_width=True)
+
+    # Measured speed and memory (written by benchmark.py)
+    st.subheader("Measured Performance")
+    benchmark = load_results()
+    if benchmark is None:
+        st.info("No benchmark results yet. Run `python benchmark.py` to measure load time, "
+                "time to first token, throughput and memory on this machine.")
+    else:
+        summary = summarize(benchmark)
+        st.dataframe(pd.DataFrame(summary).rename(columns={
+            'model': 'Model',
+            'load_time_s': 'Load Time (s)',
+            'ttft_ms': 'Time to First Token (ms)',
+            'tokens_per_sec': 'Tokens/sec',
+            'latency_p90_ms': 'p90 Token Latency (ms)',
+            'peak_rss_mb': 'Peak RSS (MB)'
+        }), use_container_width=True)
+        env = benchmark['environment']
+        st.caption(f"Measured {benchmark['created']} on {env['cpu_count']} CPUs, "
+                   f"torch {env['torch']}, transformers {env['transformers']} "
+                   "(sampling, batch size 1)")
+        with st.expander("All benchmark runs"):
+            st.dataframe(pd.DataFrame(benchmark['results']), use_container_width=True)
     
     # Detailed comparison
     st.subheader("Detailed Comparison")
@@ -207,7 +324,9 @@ elif page == "Model Comparison":
     
     with col1:
         st.metric("Creativity", "GPT-2", "Highest")
-        st.metric("Speed", "GPT-2", "Fastest")
+        if benchmark is not None:
+            fastest = max(summary, key=lambda row: row['tokens_per_sec'])
+            st.metric("Speed", fastest['model'], f"{fastest['tokens_per_sec']:.0f} tokens/sec")
     
     with col2:
         st.metric("Instruction Following", "FLAN-T5", "Best")
@@ -277,50 +396,14 @@ elif page == "Evaluation":
     # Calculate metrics
     st.subheader("Automatic Metrics Analysis")
     
-    # Initialize ROUGE
-    rouge = Rouge()
-    
-    # Calculate metrics for each model
-    metrics = {
-        'gpt2': {'bleu': [], 'rouge': []},
-        'flan-t5': {'bleu': [], 'rouge': []},
-        'bart': {'bleu': [], 'rouge': []}
+    # Score every model's stories against GPT-2's (the reference scores itself 1.0)
+    models = ['gpt2', 'flan-t5', 'bart']
+    references = [story_data['gpt2'] for story_data in example_stories.values()]
+    avg_metrics = {
+        model: evaluate([story_data[model] for story_data in example_stories.values()], references)
+        for model in models
     }
     
-    # Calculate BLEU and ROUGE scores for each story
-    for story_data in example_stories.values():
-        reference = story_data['gpt2']  # Using GPT-2 as reference
-        reference_tokens = [word_tokenize(reference.lower())]
-        
-        for model in ['gpt2', 'flan-t5', 'bart']:
-            if model != 'gpt2':  # Skip comparing GPT-2 with itself
-                hypothesis = story_data[model]
-                hypothesis_tokens = word_tokenize(hypothesis.lower())
-                
-                # Calculate BLEU score
-                bleu_score = sentence_bleu(reference_tokens, hypothesis_tokens)
-                metrics[model]['bleu'].append(bleu_score)
-                
-                # Calculate ROUGE score
-                rouge_scores = rouge.get_scores(hypothesis, reference)[0]
-                metrics[model]['rouge'].append(rouge_scores['rouge-l']['f'])
-    
-    # Calculate average scores
-    avg_metrics = {}
-    for model in metrics:
-        if model == 'gpt2':
-            # For GPT-2, we'll use the average of other models' scores as reference
-            avg_metrics[model] = {
-                'bleu': 1.0,  # Perfect score since it's the reference
-                'rouge': 1.0  # Perfect score since it's the reference
-            }
-        else:
-            # For other models, calculate average of their scores
-            avg_metrics[model] = {
-                'bleu': sum(metrics[model]['bleu']) / len(metrics[model]['bleu']) if metrics[model]['bleu'] else 0,
-                'rouge': sum(metrics[model]['rouge']) / len(metrics[model]['rouge']) if metrics[model]['rouge'] else 0
-            }
-    
     # Display BLEU scores
     st.markdown("### BLEU Score")
     st.markdown("""
@@ -334,8 +417,22 @@ elif page == "Evaluation":
     st.markdown("""
     ROUGE (Recall-Oriented Understudy for Gisting Evaluation) measures the overlap of n-grams between generated and reference text.
     """)
+    st.dataframe(pd.DataFrame({
+        model.upper(): {
+            'ROUGE-1': scores['rouge-1']['f'],
+            'ROUGE-2': scores['rouge-2']['f'],
+            'ROUGE-L': scores['rouge-l']['f']
+        }
+        for model, scores in avg_metrics.items()
+    }).T.round(2), use_container_width=True)
+
+    # Display diversity
+    st.markdown("### Distinct-n")
+    st.markdown("""
+    Distinct-n is the share of unique n-grams across a model's stories; higher means less repetitive output.
+    """)
     for model, scores in avg_metrics.items():
-        st.markdown(f"- {model.upper()}: ROUGE-L = {scores['rouge']:.2f}")
+        st.markdown(f"- {model.upper()}: distinct-1 = {scores['distinct-1']:.2f}, distinct-2 = {scores['distinct-2']:.2f}")
     
     # Strengths and Limitations
     st.header("Strengths and Limitations")
@@ -0,0 +1,253 @@
+"""
+Reproducible generation benchmark for StoryGenerator.
+
+Every configuration (model, thread count, max_length, decoding mode,
+batch size) runs in a fresh subprocess, so load time and peak RSS are
+measured from a cold start for that configuration alone and torch's thread
+setting does not leak between runs. Each is timed after one warm-up run.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --models gpt2 bart --max-lengths 100 300 --modes sample beam \\
+        --batch-sizes 1 4 --threads 1 4 --repeats 3 --output benchmark_results.json --csv benchmark_results.csv
+
+The Streamlit "Model Comparison" page shows the numbers from
+benchmark_results.json when that file exists.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import time
+
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.json')
+
+MODES = ('sample', 'beam')
+
+CSV_FIELDS = [
+    'model', 'threads', 'max_length', 'mode', 'batch_size', 'load_time_s', 'peak_rss_mb',
+    'ttft_ms', 'tokens_per_sec', 'latency_p50_ms', 'latency_p90_ms', 'latency_p99_ms', 'steps'
+]
+
+
+def _percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def _peak_rss_mb():
+    # Unix only, so imported here: the app imports this module on Windows too
+    import resource
+
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if platform.system() == 'Darwin' else peak / 1024
+
+
+def _make_step_timer():
+    """A LogitsProcessor that timestamps every decoding step (works for sampling and beam search)"""
+    from transformers import LogitsProcessor
+
+    class StepTimer(LogitsProcessor):
+        def __init__(self):
+            self.times = []
+
+        def __call__(self, input_ids, scores):
+            self.times.append(time.perf_counter())
+            return scores
+
+    return StepTimer()
+
+
+def _timed_generate(generator, model_name, prompts, max_length, mode):
+    """Run one generate call; returns (start time, step timestamps)"""
+    import torch
+    from transformers import LogitsProcessorList
+
+    from decoding import DecodingPolicy
+
+    model_info = generator._load_model(model_name)
+    model, tokenizer = model_info['model'], model_info['tokenizer']
+    formatted = [generator._format_prompt(prompt, model_name) for prompt in prompts]
+
+    # No deadline or repetition block: the benchmark times full-length decoding
+    policy = DecodingPolicy(max_time=None, no_repeat_ngram_size=0)
+    kwargs = generator._generation_kwargs(model_name, tokenizer, max_length, 0.7, 50, 0.9, policy)
+    if mode == 'beam':
+        kwargs.update(num_beams=4, do_sample=False, early_stopping=True)
+    else:
+        kwargs.update(num_beams=1, do_sample=True)
+        kwargs.pop('early_stopping', None)
+
+    timer = _make_step_timer()
+    start = time.perf_counter()
+    inputs = tokenizer(formatted, return_tensors='pt', padding=True).to(generator.device)
+    with torch.no_grad():
+        model.generate(**inputs, logits_processor=LogitsProcessorList([timer]), **kwargs)
+    return start, timer.times
+
+
+def _run_config(model_name, threads, max_length, mode, batch_size, repeats):
+    """Benchmark one configuration (runs in its own subprocess); None if nothing was generated"""
+    import torch
+
+    from quantization import QUALITY_SET
+    from story_generator import StoryGenerator
+
+    torch.set_num_threads(threads)
+    generator = StoryGenerator(prefix_cache_mb=0)
+    prompts = [prompt for prompt, _ in QUALITY_SET]
+
+    start = time.perf_counter()
+    generator._load_model(model_name)
+    load_time = time.perf_counter() - start
+
+    batch = [prompts[i % len(prompts)] for i in range(batch_size)]
+    _timed_generate(generator, model_name, batch, max_length, mode)  # warm-up
+
+    ttfts, throughputs, latencies, steps = [], [], [], []
+    for _ in range(repeats):
+        begin, times = _timed_generate(generator, model_name, batch, max_length, mode)
+        end = time.perf_counter()
+        if not times:
+            continue
+        ttfts.append(times[0] - begin)
+        # One output token per prompt per decoding step
+        throughputs.append(len(times) * batch_size / (end - begin))
+        latencies.extend(b - a for a, b in zip(times, times[1:]))
+        steps.append(len(times))
+
+    if not ttfts:
+        return None
+    return {
+        'model': model_name,
+        'threads': threads,
+        'max_length': max_length,
+        'mode': mode,
+        'batch_size': batch_size,
+        'load_time_s': round(load_time, 3),
+        # The process ran only this configuration, so this is its own peak (model load included)
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'ttft_ms': round(statistics.median(ttfts) * 1000, 2),
+        'tokens_per_sec': round(statistics.median(throughputs), 2),
+        'latency_p50_ms': round(_percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'latency_p90_ms': round(_percentile(latencies, 90) * 1000, 2) if latencies else None,
+        'latency_p99_ms': round(_percentile(latencies, 99) * 1000, 2) if latencies else None,
+        'steps': round(statistics.median(steps)),
+    }
+
+
+def run_benchmark(models, max_lengths, modes, batch_sizes, threads, repeats=3):
+    """
+    Run the full matrix, one fresh subprocess per configuration.
+
+    Returns:
+        list of dict: One row per configuration (see CSV_FIELDS)
+    """
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for model_name in models:
+        for thread_count in threads:
+            for max_length in max_lengths:
+                for mode in modes:
+                    for batch_size in batch_sizes:
+                        print(f"Benchmarking {model_name}: {thread_count} thread(s), max_length={max_length}, "
+                              f"{mode}, batch size {batch_size}...", flush=True)
+                        with context.Pool(1) as pool:
+                            row = pool.apply(
+                                _run_config,
+                                (model_name, thread_count, max_length, mode, batch_size, repeats)
+                            )
+                        if row is not None:
+                            rows.append(row)
+    return rows
+
+
+def write_results(rows, json_path=None, csv_path=None):
+    if json_path:
+        import torch
+        import transformers
+
+        payload = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environment': {
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'cpu_count': os.cpu_count(),
+                'torch': torch.__version__,
+                'transformers': transformers.__version__,
+            },
+            'results': rows,
+        }
+        with open(json_path, 'w') as f:
+            json.dump(payload, f, indent=2)
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def load_results(path=DEFAULT_RESULTS):
+    """Benchmark results written by this script, or None if there are none"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def summarize(results):
+    """
+    One row per model for the comparison page.
+
+    Uses the batch size 1 sampling runs (the app's own setting) at the
+    largest thread count measured; falls back to all runs of the model.
+    """
+    rows = results['results']
+    summary = []
+    for model_name in dict.fromkeys(row['model'] for row in rows):
+        model_rows = [row for row in rows if row['model'] == model_name]
+        max_threads = max(row['threads'] for row in model_rows)
+        selected = [
+            row for row in model_rows
+            if row['mode'] == 'sample' and row['batch_size'] == 1 and row['threads'] == max_threads
+        ] or model_rows
+        summary.append({
+            'model': model_name,
+            'load_time_s': statistics.median(row['load_time_s'] for row in selected),
+            'ttft_ms': statistics.median(row['ttft_ms'] for row in selected),
+            'tokens_per_sec': statistics.median(row['tokens_per_sec'] for row in selected),
+            'latency_p90_ms': statistics.median(
+                row['latency_p90_ms'] for row in selected if row['latency_p90_ms'] is not None
+            ) if any(row['latency_p90_ms'] is not None for row in selected) else None,
+            'peak_rss_mb': max(row['peak_rss_mb'] for row in selected),
+        })
+    return summary
+
+
+def main():
+    from story_generator import MODEL_SPECS
+
+    parser = argparse.ArgumentParser(description="Benchmark StoryGenerator models")
+    parser.add_argument('--models', nargs='+', default=list(MODEL_SPECS), choices=list(MODEL_SPECS))
+    parser.add_argument('--max-lengths', nargs='+', type=int, default=[100, 300])
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--threads', nargs='+', type=int, default=[os.cpu_count() or 1])
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per configuration")
+    parser.add_argument('--output', default=DEFAULT_RESULTS, help="JSON results file")
+    parser.add_argument('--csv', help="Also write the results as CSV")
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.models, args.max_lengths, args.modes, args.batch_sizes, args.threads, args.repeats)
+    write_results(rows, args.output, args.csv)
+    for row in rows:
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import time
+
+from transformers import MaxTimeCriteria, StoppingCriteriaList
+
+
+class DecodingPolicy:
+    """
+    How the encoder-decoder models (FLAN-T5, BART) decode a story.
+
+    Beam search and sampling are separate modes: one beam samples with the
+    request's temperature / top-k / top-p, more beams run deterministic beam
+    search. Beam-sampling with four beams used to cost four decoder passes
+    per token on every request.
+
+    Args:
+        num_beams (int): 1 = sampling, >1 = beam search with this width
+        max_new_tokens (int or None): Token budget for the story; None uses
+            the request's max_length
+        max_time (float or None): Wall-clock budget in seconds, counted from
+            the start of the request. When it runs out generation stops and
+            the best hypothesis so far is returned (None = no limit)
+        length_penalty (float): Exponent on length when ranking beams; > 1
+            favours longer stories, < 1 shorter ones
+        no_repeat_ngram_size (int): Never repeat an n-gram of this size
+            (0 disables)
+    """
+
+    def __init__(self, num_beams=1, max_new_tokens=None, max_time=30.0, length_penalty=1.0,
+                 no_repeat_ngram_size=3):
+        if num_beams < 1:
+            raise ValueError("num_beams must be at least 1")
+        self.num_beams = num_beams
+        self.max_new_tokens = max_new_tokens
+        self.max_time = max_time
+        self.length_penalty = length_penalty
+        self.no_repeat_ngram_size = no_repeat_ngram_size
+
+    def generate_kwargs(self, start=None):
+        """
+        model.generate arguments for this policy.
+
+        Args:
+            start (float or None): time.time() at which the request began;
+                the deadline is measured from here (default: now)
+        """
+        kwargs = {'num_beams': self.num_beams, 'do_sample': self.num_beams == 1}
+        if self.num_beams > 1:
+            kwargs['early_stopping'] = True
+            kwargs['length_penalty'] = self.length_penalty
+        if self.max_new_tokens:
+            kwargs['max_new_tokens'] = self.max_new_tokens
+        if self.no_repeat_ngram_size:
+            kwargs['no_repeat_ngram_size'] = self.no_repeat_ngram_size
+        if self.max_time:
+            # Beam search finalizes its current beams when a stopping criterion fires
+            kwargs['stopping_criteria'] = StoppingCriteriaList([
+                MaxTimeCriteria(self.max_time, initial_timestamp=start if start is not None else time.time())
+            ])
+        return kwargs
+
+    def __repr__(self):
+        return (f"DecodingPolicy(num_beams={self.num_beams}, max_new_tokens={self.max_new_tokens}, "
+                f"max_time={self.max_time}, length_penalty={self.length_penalty}, "
+                f"no_repeat_ngram_size={self.no_repeat_ngram_size})")
@@ -0,0 +1,237 @@
+"""
+Corpus-level story evaluation: BLEU, ROUGE-1/2/L and distinct-n.
+
+Everything needed ships with this module (a regex tokenizer instead of
+NLTK's punkt models), so nothing is downloaded at import time.
+
+N-grams are counted with numpy: tokens are mapped to small integer ids,
+every n-gram is packed into one uint64 and counted with np.unique, and
+overlaps are found with np.intersect1d. ROUGE-L uses a bit-parallel LCS.
+Per-pair statistics are cached by text hash, so scoring the same stories
+again (e.g. on a Streamlit rerun) is free, and large inputs are scored
+across processes.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Words (keeping contractions like "wizard's" together), numbers, punctuation
+_TOKEN_RE = re.compile(r"\w+(?:['’]\w+)*|[^\w\s]", re.UNICODE)
+
+MAX_N = 4
+PARALLEL_MIN_PAIRS = 256
+CACHE_SIZE = 100_000
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercased word and punctuation tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _to_ids(*token_lists):
+    """Map tokens to dense integer ids shared by all the given lists"""
+    vocab = {}
+    arrays = [
+        np.fromiter((vocab.setdefault(token, len(vocab)) for token in tokens), dtype=np.uint64, count=len(tokens))
+        for tokens in token_lists
+    ]
+    return arrays, max(1, len(vocab).bit_length())
+
+
+def _ngram_counts(ids, n, bits):
+    """
+    Unique n-grams of an id array and their counts.
+
+    Returns:
+        tuple: (sorted packed keys, counts); keys are uint64 when n * bits
+        fits in 64 bits, otherwise rows of an (k, n) array
+    """
+    if len(ids) < n:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(ids, n)
+    if n * bits <= 64:
+        keys = np.zeros(len(windows), dtype=np.uint64)
+        for i in range(n):
+            keys |= windows[:, i] << np.uint64(bits * (n - 1 - i))
+        return np.unique(keys, return_counts=True)
+    # Very large vocabularies: compare whole rows through a void view
+    rows = np.ascontiguousarray(windows).view(np.dtype((np.void, 8 * n))).ravel()
+    return np.unique(rows, return_counts=True)
+
+
+def _overlap(hyp_counts, ref_counts):
+    """Clipped n-gram matches: sum over shared n-grams of min(count in hyp, count in ref)"""
+    hyp_keys, hyp_n = hyp_counts
+    ref_keys, ref_n = ref_counts
+    _, hyp_idx, ref_idx = np.intersect1d(hyp_keys, ref_keys, assume_unique=True, return_indices=True)
+    return int(np.minimum(hyp_n[hyp_idx], ref_n[ref_idx]).sum())
+
+
+def lcs_length(a, b):
+    """
+    Length of the longest common subsequence of two id sequences.
+
+    Bit-parallel (Allison-Dix / Hyyrö): each position of `b` is one bit of a
+    Python int, so every token of `a` costs a few big-int operations instead
+    of a row of the dynamic-programming table.
+    """
+    if not len(a) or not len(b):
+        return 0
+    masks = {}
+    for i, token in enumerate(b.tolist()):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    v = full
+    for token in a.tolist():
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(b) - bin(v).count('1')
+
+
+def _f1(matches, hyp_total, ref_total):
+    precision = matches / hyp_total if hyp_total else 0.0
+    recall = matches / ref_total if ref_total else 0.0
+    f = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f
+
+
+def _pair_stats(hypothesis, reference):
+    """
+    Sufficient statistics for one (hypothesis, reference) pair.
+
+    Returns:
+        dict: 'bleu_matches' / 'bleu_totals' per n (1..MAX_N), 'hyp_len',
+        'ref_len', and (precision, recall, f) for 'rouge-1', 'rouge-2', 'rouge-l'
+    """
+    (hyp, ref), bits = _to_ids(tokenize(hypothesis), tokenize(reference))
+    stats = {'hyp_len': len(hyp), 'ref_len': len(ref), 'bleu_matches': [], 'bleu_totals': []}
+    for n in range(1, MAX_N + 1):
+        hyp_counts, ref_counts = _ngram_counts(hyp, n, bits), _ngram_counts(ref, n, bits)
+        matches = _overlap(hyp_counts, ref_counts)
+        stats['bleu_matches'].append(matches)
+        stats['bleu_totals'].append(max(0, len(hyp) - n + 1))
+        if n <= 2:
+            stats[f'rouge-{n}'] = _f1(matches, max(0, len(hyp) - n + 1), max(0, len(ref) - n + 1))
+    stats['rouge-l'] = _f1(lcs_length(hyp, ref), len(hyp), len(ref))
+    return stats
+
+
+def _pair_stats_chunk(pairs):
+    return [_pair_stats(hypothesis, reference) for hypothesis, reference in pairs]
+
+
+def _pair_key(hypothesis, reference):
+    return hashlib.sha1(f"{hypothesis}\0{reference}".encode('utf-8')).hexdigest()
+
+
+def pair_statistics(hypotheses, references, workers=None):
+    """
+    Statistics for every (hypothesis, reference) pair, using the cache.
+
+    Uncached pairs are scored in this process, or across `workers` processes
+    when there are at least PARALLEL_MIN_PAIRS of them.
+    """
+    keys = [_pair_key(h, r) for h, r in zip(hypotheses, references)]
+    results = {}
+    with _cache_lock:
+        for key in keys:
+            if key in _cache:
+                _cache.move_to_end(key)
+                results[key] = _cache[key]
+
+    missing = {}
+    for key, hypothesis, reference in zip(keys, hypotheses, references):
+        if key not in results:
+            missing.setdefault(key, (hypothesis, reference))
+
+    if missing:
+        missing_keys, missing_pairs = list(missing), list(missing.values())
+        workers = workers or os.cpu_count() or 1
+        if len(missing_pairs) >= PARALLEL_MIN_PAIRS and workers > 1:
+            size = math.ceil(len(missing_pairs) / workers)
+            chunks = [missing_pairs[i:i + size] for i in range(0, len(missing_pairs), size)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                computed = [stats for chunk in pool.map(_pair_stats_chunk, chunks) for stats in chunk]
+        else:
+            computed = _pair_stats_chunk(missing_pairs)
+
+        with _cache_lock:
+            for key, stats in zip(missing_keys, computed):
+                results[key] = stats
+                _cache[key] = stats
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    return [results[key] for key in keys]
+
+
+def corpus_bleu(stats):
+    """
+    Corpus BLEU-4 from pair statistics: clipped n-gram precisions are summed
+    over the corpus before taking the geometric mean, and the brevity penalty
+    uses the total lengths. Zero counts are smoothed with epsilon 0.1
+    (Chen & Cherry method 1) so one missing 4-gram does not zero the score.
+    """
+    hyp_len = sum(s['hyp_len'] for s in stats)
+    ref_len = sum(s['ref_len'] for s in stats)
+    if not hyp_len:
+        return 0.0
+
+    log_precision = 0.0
+    for n in range(MAX_N):
+        matches = sum(s['bleu_matches'][n] for s in stats)
+        totals = sum(s['bleu_totals'][n] for s in stats)
+        if not totals:
+            return 0.0
+        log_precision += math.log((matches or 0.1) / totals) / MAX_N
+
+    brevity = 1.0 if hyp_len > ref_len else math.exp(1 - ref_len / hyp_len)
+    return brevity * math.exp(log_precision)
+
+
+def distinct_n(texts, n):
+    """Share of unique n-grams among all n-grams of the texts (diversity)"""
+    id_arrays, bits = _to_ids(*(tokenize(text) for text in texts))
+    keys = [_ngram_counts(ids, n, bits) for ids in id_arrays]
+    total = sum(int(counts.sum()) for _, counts in keys)
+    if not total:
+        return 0.0
+    return len(np.unique(np.concatenate([k for k, _ in keys]))) / total
+
+
+def evaluate(hypotheses, references, distinct=(1, 2), workers=None):
+    """
+    Score generated stories against references.
+
+    Args:
+        hypotheses (list of str): Generated stories
+        references (list of str): One reference story per hypothesis
+        distinct (iterable of int): n values for distinct-n
+        workers (int or None): Processes for large inputs (default: all cores)
+
+    Returns:
+        dict: 'bleu', 'rouge-1' / 'rouge-2' / 'rouge-l' as {'p', 'r', 'f'}
+        averaged over pairs, and 'distinct-<n>' over all hypotheses
+    """
+    if len(hypotheses) != len(references):
+        raise ValueError("Need exactly one reference per hypothesis")
+    if not hypotheses:
+        raise ValueError("Nothing to evaluate")
+
+    stats = pair_statistics(hypotheses, references, workers)
+    scores = {'bleu': corpus_bleu(stats)}
+    for name in ('rouge-1', 'rouge-2', 'rouge-l'):
+        p, r, f = (sum(values) / len(stats) for values in zip(*(s[name] for s in stats)))
+        scores[name] = {'p': p, 'r': r, 'f': f}
+    for n in distinct:
+        scores[f'distinct-{n}'] = distinct_n(hypotheses, n)
+    return scores
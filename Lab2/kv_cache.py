@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict
+
+import torch
+from transformers import DynamicCache
+
+
+def cache_layers(past_key_values):
+    """
+    Per-layer (key, value) tensors of a model's past_key_values.
+
+    Works for both the legacy tuple format and `DynamicCache` objects.
+    Tensors are [batch, heads, seq_len, head_dim].
+    """
+    return [(layer[0], layer[1]) for layer in past_key_values]
+
+
+def build_cache(layers):
+    """Wrap per-layer (key, value) tensors in a DynamicCache the model accepts"""
+    cache = DynamicCache()
+    for layer_idx, (key, value) in enumerate(layers):
+        cache.update(key, value, layer_idx)
+    return cache
+
+
+def left_pad_layers(layers, length):
+    """Left-pad every layer's keys/values with zeros to `length` positions"""
+    padded = []
+    for key, value in layers:
+        missing = length - key.size(2)
+        if missing > 0:
+            pad_shape = (key.size(0), key.size(1), missing, key.size(3))
+            key = torch.cat([key.new_zeros(pad_shape), key], dim=2)
+            value = torch.cat([value.new_zeros(pad_shape), value], dim=2)
+        padded.append((key, value))
+    return padded
+
+
+def _common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class PrefixCache:
+    """
+    LRU cache of prompt state, bounded by memory.
+
+    Decoder-only models store past key/values for a token prefix; a lookup
+    returns the longest cached prefix shared with the new prompt, so both
+    repeated prompts and prompts sharing an instruction prefix skip that part
+    of the prefill. Encoder-decoder models store the encoder output of whole
+    prompts.
+
+    Args:
+        max_bytes (int): Memory budget for cached tensors
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _put(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def get_encoder_output(self, model_name, token_ids):
+        """Cached encoder hidden states for exactly these prompt tokens, or None"""
+        key = (model_name, 'encoder', tuple(token_ids))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put_encoder_output(self, model_name, token_ids, hidden_states):
+        self._put((model_name, 'encoder', tuple(token_ids)), hidden_states,
+                  hidden_states.numel() * hidden_states.element_size())
+
+    def longest_prefix(self, model_name, token_ids):
+        """
+        Past key/values for the longest cached prefix of `token_ids`.
+
+        Returns:
+            tuple: (length, layers) where layers are (key, value) tensors
+            already cut to `length` positions; (0, None) on a miss
+        """
+        token_ids = tuple(token_ids)
+        with self._lock:
+            best_key, best_length = None, 0
+            for key in self._entries:
+                if key[0] == model_name and key[1] == 'decoder':
+                    length = _common_prefix_length(key[2], token_ids)
+                    if length > best_length:
+                        best_key, best_length = key, length
+            if best_key is None:
+                self.misses += 1
+                return 0, None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            layers = self._entries[best_key][0]
+
+        return best_length, [(key[:, :, :best_length], value[:, :, :best_length]) for key, value in layers]
+
+    def put_prefix(self, model_name, token_ids, layers):
+        """Store past key/values ([1, heads, len(token_ids), head_dim] per layer)"""
+        nbytes = sum(key.numel() * key.element_size() * 2 for key, _ in layers)
+        self._put((model_name, 'decoder', tuple(token_ids)), layers, nbytes)
+
+    def drop_model(self, model_name):
+        """Forget every entry of a model (e.g. after it is unloaded)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == model_name]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'mb': round(self._bytes / 1024 ** 2, 1),
+                'hits': self.hits,
+                'misses': self.misses
+            }
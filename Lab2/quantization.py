@@ -0,0 +1,157 @@
+import argparse
+import math
+import os
+
+import torch
+import transformers
+from torch import nn
+from transformers.pytorch_utils import Conv1D
+
+PRECISIONS = ('fp32', 'int8', 'bf16')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'lab2', 'quantized')
+
+# Fixed prompt set for the quality guard: (prompt, reference story opening)
+QUALITY_SET = [
+    ("A young wizard discovers a mysterious book in an ancient library",
+     "The young wizard's fingers trembled as they traced the worn leather binding of the ancient tome."),
+    ("A robot learns to paint and discovers the meaning of art",
+     "The robot's metallic fingers held the brush with surprising delicacy as it studied the empty canvas."),
+    ("A time traveler accidentally brings a dinosaur to the present",
+     "The portal shimmered, and before Dr. Chen could react, a massive shadow stepped into the laboratory."),
+    ("A lighthouse keeper receives a letter from the sea",
+     "Every morning the keeper walked the shore, but today a glass bottle waited for him on the rocks."),
+]
+
+
+def cpu_supports_bf16():
+    """True if the CPU has native bf16 instructions (AVX512-BF16 or AMX)"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def _conv1d_to_linear(model):
+    """
+    Replace GPT-2's Conv1D projections with equivalent nn.Linear layers.
+
+    Conv1D stores its weight transposed; dynamic quantization only handles
+    nn.Linear, so without this GPT-2's attention and MLP stay in fp32.
+    """
+    for module in list(model.modules()):
+        for child_name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, child_name, linear)
+    return model
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of every Linear layer (weights int8, activations quantized on the fly)"""
+    model = _conv1d_to_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def load_int8_model(model_cls, checkpoint, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load a dynamically quantized model, converting it only once.
+
+    The quantized module is pickled to disk; the file name includes the
+    torch and transformers versions because the pickle depends on both.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(
+        cache_dir,
+        f"{checkpoint.replace('/', '--')}-int8-torch{torch.__version__}-tf{transformers.__version__}.pt"
+    )
+    if os.path.exists(path):
+        return torch.load(path, weights_only=False)
+
+    model = quantize_int8(model_cls.from_pretrained(checkpoint))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, path)
+    return model
+
+
+def perplexity(generator, model_name, samples=QUALITY_SET):
+    """
+    Perplexity of `model_name` on (prompt, story) pairs.
+
+    GPT-2 scores prompt and story as one text; the encoder-decoder models
+    score the story given their formatted prompt.
+    """
+    model_info = generator._load_model(model_name)
+    model, tokenizer = model_info['model'], model_info['tokenizer']
+
+    total_loss, total_tokens = 0.0, 0
+    with torch.no_grad():
+        for prompt, story in samples:
+            if model.config.is_encoder_decoder:
+                inputs = tokenizer(generator._format_prompt(prompt, model_name), return_tensors='pt')
+                labels = tokenizer(story, return_tensors='pt')['input_ids']
+                loss = model(**inputs.to(generator.device), labels=labels.to(generator.device)).loss
+                tokens = labels.size(1)
+            else:
+                input_ids = tokenizer(f"{prompt}. {story}", return_tensors='pt')['input_ids'].to(generator.device)
+                loss = model(input_ids=input_ids, labels=input_ids).loss
+                tokens = input_ids.size(1) - 1
+            total_loss += float(loss) * tokens
+            total_tokens += tokens
+    return math.exp(total_loss / total_tokens)
+
+
+def check_quality(model_name, precision, max_increase=0.05):
+    """
+    Quality guard: compare perplexity at `precision` against the fp32 baseline.
+
+    Returns:
+        dict: {'fp32', precision, 'relative_increase', 'passed'}; if this
+        machine cannot run `precision` (int8 on CUDA, bf16 on a CPU without
+        bf16) the generator falls back to fp32, nothing is compared and the
+        dict is {'fp32', precision: None, 'fallback', 'passed': False}
+    """
+    from story_generator import StoryGenerator
+
+    generator = StoryGenerator(precision=precision, prefix_cache_mb=0)
+    if generator.precision != precision:
+        return {
+            'fp32': None,
+            precision: None,
+            'fallback': f"{precision} is not supported on {generator.device.type}; "
+                        f"the generator runs {generator.precision}",
+            'passed': False
+        }
+
+    baseline = perplexity(StoryGenerator(precision='fp32', prefix_cache_mb=0), model_name)
+    candidate = perplexity(generator, model_name)
+    increase = candidate / baseline - 1
+    return {
+        'fp32': round(baseline, 3),
+        precision: round(candidate, 3),
+        'relative_increase': round(increase, 4),
+        'passed': increase <= max_increase
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perplexity check of a reduced-precision mode against fp32")
+    parser.add_argument('--model', default='gpt2')
+    parser.add_argument('--precision', default='int8', choices=PRECISIONS[1:])
+    parser.add_argument('--max-increase', type=float, default=0.05,
+                        help="Largest allowed relative perplexity increase")
+    args = parser.parse_args()
+
+    result = check_quality(args.model, args.precision, args.max_increase)
+    print(result)
+    raise SystemExit(0 if result['passed'] else 1)
+
+
+if __name__ == '__main__':
+    main()
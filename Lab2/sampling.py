@@ -0,0 +1,46 @@
+import torch
+
+
+def filter_logits(logits, temperature=1.0, top_k=0, top_p=1.0):
+    """
+    Apply temperature, top-k and top-p (nucleus) filtering to next-token logits.
+
+    Matches the order used by `model.generate`: temperature first, then top-k,
+    then top-p. Filtered tokens get -inf.
+
+    Args:
+        logits (Tensor): [..., vocab_size] logits
+        temperature (float): Sampling temperature
+        top_k (int): Keep only the k most likely tokens (0 = no limit)
+        top_p (float): Keep the smallest set of tokens with this cumulative probability
+
+    Returns:
+        Tensor: Filtered logits, same shape
+    """
+    logits = logits / max(temperature, 1e-5)
+
+    if top_k and top_k < logits.size(-1):
+        kth = torch.topk(logits, top_k, dim=-1).values[..., -1:]
+        logits = logits.masked_fill(logits < kth, float('-inf'))
+
+    if top_p < 1.0:
+        sorted_logits, sorted_idx = torch.sort(logits, descending=True, dim=-1)
+        cumulative = sorted_logits.softmax(dim=-1).cumsum(dim=-1)
+        # Remove tokens once the mass before them already exceeds top_p (the first token always stays)
+        remove = cumulative - sorted_logits.softmax(dim=-1) >= top_p
+        remove = remove.scatter(-1, sorted_idx, remove)
+        logits = logits.masked_fill(remove, float('-inf'))
+
+    return logits
+
+
+def sampling_probs(logits, temperature=1.0, top_k=0, top_p=1.0):
+    """Next-token probabilities after temperature / top-k / top-p filtering"""
+    return filter_logits(logits, temperature, top_k, top_p).softmax(dim=-1)
+
+
+def sample_next_token(logits, temperature=1.0, top_k=0, top_p=1.0):
+    """Sample token ids from [..., vocab_size] logits"""
+    probs = sampling_probs(logits, temperature, top_k, top_p)
+    flat = probs.reshape(-1, probs.size(-1))
+    return torch.multinomial(flat, num_samples=1).reshape(probs.shape[:-1])
@@ -0,0 +1,145 @@
+import threading
+
+import torch
+
+from kv_cache import build_cache, cache_layers
+from sampling import sampling_probs
+
+
+class SpeculationStats:
+    """Running acceptance-rate counters, safe to share between concurrent generations"""
+
+    def __init__(self):
+        self.rounds = 0
+        self.proposed = 0
+        self.accepted = 0
+        self.generated = 0
+        self._lock = threading.Lock()
+
+    def record(self, rounds=0, proposed=0, accepted=0, generated=0):
+        with self._lock:
+            self.rounds += rounds
+            self.proposed += proposed
+            self.accepted += accepted
+            self.generated += generated
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'proposed': self.proposed,
+                'accepted': self.accepted,
+                'acceptance_rate': round(self.accepted / self.proposed, 4) if self.proposed else 0.0,
+                # Tokens produced per target forward pass (1.0 = no speed-up)
+                'tokens_per_target_pass': round(self.generated / self.rounds, 3) if self.rounds else 0.0
+            }
+
+
+def _forward(model, layers, token_ids, device):
+    """Run `token_ids` on top of a cache; returns (logits [len, vocab], new layers)"""
+    input_ids = torch.tensor([token_ids], device=device)
+    outputs = model(
+        input_ids=input_ids,
+        past_key_values=build_cache(layers) if layers else None,
+        use_cache=True
+    )
+    return outputs.logits[0], cache_layers(outputs.past_key_values)
+
+
+def _cached_length(layers):
+    return layers[0][0].size(2) if layers else 0
+
+
+def _crop(layers, length):
+    return [(key[:, :, :length], value[:, :, :length]) for key, value in layers]
+
+
+def speculative_generate(target, draft, prompt_ids, max_new_tokens, temperature=0.7, top_k=50,
+                         top_p=0.9, num_draft_tokens=4, eos_token_id=None, stats=None):
+    """
+    Speculative sampling (Leviathan et al. / Chen et al.).
+
+    The draft proposes `num_draft_tokens` tokens autoregressively, the target
+    scores all of them in one forward pass, and each proposal x is accepted
+    with probability min(1, p(x) / q(x)). On rejection a token is drawn from
+    the residual max(0, p - q); when every proposal is accepted a bonus token
+    is drawn from the target. p and q are filtered with the same
+    temperature / top-k / top-p, so the output follows exactly the target's
+    sampling distribution.
+
+    Args:
+        target, draft: Causal LMs sharing a tokenizer
+        prompt_ids (list of int): Prompt token ids (at least one)
+        max_new_tokens (int): Maximum number of tokens to generate
+        num_draft_tokens (int): Tokens proposed per round
+        eos_token_id (int or None): Stop after this token
+        stats (SpeculationStats or None): Updated with acceptance counters
+
+    Returns:
+        list of int: Generated token ids (without the prompt)
+    """
+    if not prompt_ids:
+        raise ValueError("Speculative decoding needs at least one prompt token")
+    device = next(target.parameters()).device
+    sequence = list(prompt_ids)
+    prompt_length = len(sequence)
+    target_layers, draft_layers = None, None
+
+    def probs(logits):
+        return sampling_probs(logits.float(), temperature, top_k, top_p)
+
+    with torch.no_grad():
+        while len(sequence) - prompt_length < max_new_tokens:
+            remaining = max_new_tokens - (len(sequence) - prompt_length)
+            gamma = min(num_draft_tokens, remaining)
+
+            # Draft: catch up on tokens it has not seen, then propose gamma tokens
+            proposals, draft_probs = [], []
+            feed = sequence[_cached_length(draft_layers):]
+            for _ in range(gamma):
+                logits, draft_layers = _forward(draft, draft_layers, feed, device)
+                q = probs(logits[-1])
+                token = int(torch.multinomial(q, 1))
+                proposals.append(token)
+                draft_probs.append(q)
+                feed = [token]
+
+            # Target: score every proposal (plus one bonus position) in one pass
+            target_feed = sequence[_cached_length(target_layers):] + proposals
+            logits, target_layers = _forward(target, target_layers, target_feed, device)
+            target_probs = probs(logits[-(gamma + 1):])
+
+            new_tokens = []
+            for i, token in enumerate(proposals):
+                p, q = target_probs[i], draft_probs[i]
+                if torch.rand(()) < torch.clamp(p[token] / q[token], max=1.0):
+                    new_tokens.append(token)
+                    continue
+                residual = torch.clamp(p - q, min=0)
+                if residual.sum() <= 0:
+                    residual = p
+                new_tokens.append(int(torch.multinomial(residual / residual.sum(), 1)))
+                break
+            else:
+                new_tokens.append(int(torch.multinomial(target_probs[gamma], 1)))
+
+            accepted = len(new_tokens) - 1
+            if stats is not None:
+                stats.record(rounds=1, proposed=gamma, accepted=accepted)
+
+            # Both caches must only hold the verified sequence (the last new token is fed next round)
+            valid_length = len(sequence) + accepted
+            target_layers = _crop(target_layers, valid_length)
+            draft_layers = _crop(draft_layers, min(_cached_length(draft_layers), valid_length))
+
+            new_tokens = new_tokens[:remaining]
+            if eos_token_id is not None and eos_token_id in new_tokens:
+                new_tokens = new_tokens[:new_tokens.index(eos_token_id) + 1]
+                sequence.extend(new_tokens)
+                break
+            sequence.extend(new_tokens)
+
+    generated = sequence[prompt_length:]
+    if stats is not None:
+        stats.record(generated=len(generated))
+    return generated
@@ -1,36 +1,231 @@
+import os
+import threading
+import time
+
 import torch
 from transformers import (
     GPT2LMHeadModel, GPT2Tokenizer,
     T5ForConditionalGeneration, T5Tokenizer,
-    BartForConditionalGeneration, BartTokenizer
+    BartForConditionalGeneration, BartTokenizer,
+    TextIteratorStreamer
 )
+from transformers.modeling_outputs import BaseModelOutput
 import numpy as np
 
+from kv_cache import PrefixCache, build_cache, cache_layers
+from decoding import DecodingPolicy
+from quantization import PRECISIONS, cpu_supports_bf16, load_int8_model
+from speculative import SpeculationStats, speculative_generate
+
+# model name -> (model class, tokenizer class, checkpoint)
+MODEL_SPECS = {
+    'gpt2': (GPT2LMHeadModel, GPT2Tokenizer, 'gpt2'),
+    'flan-t5': (T5ForConditionalGeneration, T5Tokenizer, 'google/flan-t5-base'),
+    'bart': (BartForConditionalGeneration, BartTokenizer, 'facebook/bart-base'),
+}
+
+# Draft models for speculative decoding; each shares its target's tokenizer
+DRAFT_SPECS = {
+    'distilgpt2': (GPT2LMHeadModel, GPT2Tokenizer, 'distilgpt2'),
+}
+DRAFT_MODELS = {'gpt2': 'distilgpt2'}
+
 class StoryGenerator:
-    def __init__(self):
-        # Initialize models and tokenizers
-        self.models = {
-            'gpt2': {
-                'model': GPT2LMHeadModel.from_pretrained('gpt2'),
-                'tokenizer': GPT2Tokenizer.from_pretrained('gpt2')
-            },
-            'flan-t5': {
-                'model': T5ForConditionalGeneration.from_pretrained('google/flan-t5-base'),
-                'tokenizer': T5Tokenizer.from_pretrained('google/flan-t5-base')
-            },
-            'bart': {
-                'model': BartForConditionalGeneration.from_pretrained('facebook/bart-base'),
-                'tokenizer': BartTokenizer.from_pretrained('facebook/bart-base')
+    def __init__(self, max_resident_models=None, idle_timeout=None, warmup=(), prefix_cache_mb=256,
+                 precision='fp32', decoding_policy=None):
+        """
+        Models are loaded lazily, on the first request that needs them.
+
+        Args:
+            max_resident_models (int or None): Keep at most this many models
+                loaded, unloading the least recently used (None = no limit)
+            idle_timeout (float or None): Unload models unused for this many
+                seconds (None = keep them loaded)
+            warmup (iterable of str): Models to load in a background thread
+                right away, so the first request does not wait for them
+            prefix_cache_mb (float): Memory for cached prompt state (past
+                key/values, encoder outputs) reused across calls; 0 disables it
+            precision (str): 'fp32', 'int8' (dynamic quantization of Linear
+                layers, CPU only, converted once and cached on disk) or 'bf16'
+                (used when the device supports it, otherwise fp32)
+            decoding_policy (DecodingPolicy or None): Default beam width and
+                token/time budgets for FLAN-T5 and BART; a request can pass
+                its own policy instead
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.max_resident_models = max_resident_models
+        self.idle_timeout = idle_timeout
+        self.precision = precision
+        if precision == 'int8' and self.device.type != 'cpu':
+            print("int8 dynamic quantization runs on CPU only; using fp32")
+            self.precision = 'fp32'
+        elif precision == 'bf16' and self.device.type == 'cpu' and not cpu_supports_bf16():
+            print("This CPU has no native bf16 support; using fp32")
+            self.precision = 'fp32'
+        self.decoding_policy = decoding_policy or DecodingPolicy()
+        self.prefix_cache = PrefixCache(int(prefix_cache_mb * 1024 ** 2)) if prefix_cache_mb else None
+
+        # model name -> {'model', 'tokenizer', 'last_used'}
+        self.models = {}
+        self._lock = threading.RLock()
+        self._load_locks = {name: threading.Lock() for name in {**MODEL_SPECS, **DRAFT_SPECS}}
+        self.speculation_stats = SpeculationStats()
+
+        if warmup:
+            threading.Thread(target=self._warmup, args=(list(warmup),), daemon=True).start()
+        if idle_timeout:
+            threading.Thread(target=self._unload_idle_models, daemon=True).start()
+
+    def _load_model(self, model_name):
+        """Return the loaded model and tokenizer, loading them on first use"""
+        if model_name not in MODEL_SPECS and model_name not in DRAFT_SPECS:
+            raise ValueError(f"Unknown model '{model_name}', expected one of {list(MODEL_SPECS)}")
+
+        with self._lock:
+            model_info = self.models.get(model_name)
+            if model_info is not None:
+                model_info['last_used'] = time.monotonic()
+                return model_info
+
+        # Loads of different models can run in parallel; one model loads once
+        with self._load_locks[model_name]:
+            with self._lock:
+                model_info = self.models.get(model_name)
+                if model_info is not None:
+                    model_info['last_used'] = time.monotonic()
+                    return model_info
+
+            model_cls, tokenizer_cls, checkpoint = MODEL_SPECS.get(model_name) or DRAFT_SPECS[model_name]
+            if self.precision == 'int8':
+                model = load_int8_model(model_cls, checkpoint)
+            else:
+                model = model_cls.from_pretrained(checkpoint).to(self.device)
+                if self.precision == 'bf16':
+                    model = model.to(torch.bfloat16)
+            model.eval()
+            tokenizer = tokenizer_cls.from_pretrained(checkpoint)
+            if model_name == 'gpt2':
+                # Decoder-only: batches must be left-padded so generation continues each prompt
+                tokenizer.pad_token = tokenizer.eos_token
+                tokenizer.padding_side = 'left'
+            model_info = {
+                'model': model,
+                'tokenizer': tokenizer,
+                'last_used': time.monotonic()
             }
+
+            with self._lock:
+                self.models[model_name] = model_info
+                if self.max_resident_models:
+                    while len(self.models) > self.max_resident_models:
+                        oldest = min(self.models, key=lambda name: self.models[name]['last_used'])
+                        self.unload_model(oldest)
+            return model_info
+
+    def _warmup(self, model_names):
+        for model_name in model_names:
+            try:
+                self._load_model(model_name)
+            except Exception as e:
+                print(f"Warm-up of {model_name} failed: {e}")
+
+    def _unload_idle_models(self):
+        while True:
+            time.sleep(min(self.idle_timeout, 30))
+            cutoff = time.monotonic() - self.idle_timeout
+            with self._lock:
+                for model_name in [name for name, info in self.models.items() if info['last_used'] < cutoff]:
+                    self.unload_model(model_name)
+
+    def unload_model(self, model_name):
+        """Free a loaded model; it is reloaded on its next use"""
+        with self._lock:
+            self.models.pop(model_name, None)
+        if self.prefix_cache is not None:
+            self.prefix_cache.drop_model(model_name)
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
+
+    def loaded_models(self):
+        """Names of the models currently in memory"""
+        with self._lock:
+            return list(self.models)
+
+    def _format_prompt(self, prompt, model_name):
+        """Add the instruction prefix the encoder-decoder models expect"""
+        if model_name == 'flan-t5':
+            return f"Write a story about: {prompt}"
+        elif model_name == 'bart':
+            return f"Write a story: {prompt}"
+        return prompt
+
+    def _generation_kwargs(self, model_name, tokenizer, max_length, temperature, top_k, top_p,
+                           policy=None, start=None):
+        """
+        Keyword arguments for model.generate for the given model.
+
+        FLAN-T5 and BART follow `policy` (default: self.decoding_policy);
+        `start` is the time.time() generation began, for its deadline.
+        """
+        kwargs = {
+            'max_length': max_length,
+            'temperature': temperature,
+            'top_k': top_k,
+            'top_p': top_p,
+            'do_sample': True
         }
-        
-        # Move models to GPU if available
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        for model_info in self.models.values():
-            model_info['model'].to(self.device)
+        if model_name == 'gpt2':
+            kwargs['pad_token_id'] = tokenizer.eos_token_id
+        else:  # T5 and BART
+            kwargs.update((policy or self.decoding_policy).generate_kwargs(start))
+            if 'max_new_tokens' in kwargs:
+                del kwargs['max_length']
+        return kwargs
+
+    def _cached_prompt_kwargs(self, model_name, model, input_ids):
+        """
+        generate() arguments that resume from cached prompt state.
+
+        GPT-2 gets the past key/values of the longest cached prefix of the
+        prompt (all but the last token, which generate must still run).
+        Encoder-decoder models get the cached encoder output of the prompt.
+        Must be called under torch.no_grad().
+        """
+        if self.prefix_cache is None:
+            return {}
+
+        token_ids = input_ids[0].tolist()
+        if model.config.is_encoder_decoder:
+            hidden_states = self.prefix_cache.get_encoder_output(model_name, token_ids)
+            if hidden_states is None:
+                hidden_states = model.get_encoder()(input_ids=input_ids).last_hidden_state
+                self.prefix_cache.put_encoder_output(model_name, token_ids, hidden_states)
+            # generate expands encoder outputs in place, so always pass a fresh wrapper
+            return {'encoder_outputs': BaseModelOutput(last_hidden_state=hidden_states)}
+
+        length, layers = self.prefix_cache.longest_prefix(model_name, token_ids[:-1])
+        if not length:
+            return {}
+        return {'past_key_values': build_cache(layers)}
+
+    def _remember_prompt(self, model_name, model, input_ids, outputs):
+        """Cache the past key/values of a GPT-2 prompt after generating from it"""
+        if self.prefix_cache is None or model.config.is_encoder_decoder:
+            return
+        prompt_length = input_ids.size(1) - 1
+        if prompt_length <= 0 or outputs.past_key_values is None:
+            return
+        layers = [
+            (key[:1, :, :prompt_length].clone(), value[:1, :, :prompt_length].clone())
+            for key, value in cache_layers(outputs.past_key_values)
+        ]
+        self.prefix_cache.put_prefix(model_name, input_ids[0, :prompt_length].tolist(), layers)
 
     def generate_story(self, prompt, model_name='gpt2', max_length=500, 
-                      temperature=0.7, top_k=50, top_p=0.9):
+                      temperature=0.7, top_k=50, top_p=0.9, speculative=False, num_draft_tokens=4,
+                      policy=None):
         """
         Generate a story based on the given prompt using the specified model.
         
@@ -41,49 +236,47 @@ class StoryGenerator:
             temperature (float): Sampling temperature
             top_k (int): Top-k sampling parameter
             top_p (float): Top-p (nucleus) sampling parameter
+            speculative (bool): Use speculative decoding with a draft model
+                (GPT-2 only; ignored for the other models)
+            num_draft_tokens (int): Tokens the draft proposes per step
+            policy (DecodingPolicy or None): Beam width and budgets for
+                FLAN-T5 and BART (None = the generator's default policy)
             
         Returns:
             str: Generated story
         """
-        model_info = self.models[model_name]
+        if speculative and model_name in DRAFT_MODELS:
+            return self._generate_speculative(prompt, model_name, max_length, temperature,
+                                              top_k, top_p, num_draft_tokens)
+
+        model_info = self._load_model(model_name)
+        # The time budget covers generation, not a first-use model load
+        start = time.time()
         model = model_info['model']
         tokenizer = model_info['tokenizer']
         
         # Format prompt based on model
-        if model_name == 'flan-t5':
-            prompt = f"Write a story about: {prompt}"
-        elif model_name == 'bart':
-            prompt = f"Write a story: {prompt}"
+        prompt = self._format_prompt(prompt, model_name)
             
         # Tokenize input
         inputs = tokenizer(prompt, return_tensors='pt').to(self.device)
         
         # Generate story
         with torch.no_grad():
-            if model_name == 'gpt2':
-                outputs = model.generate(
-                    inputs['input_ids'],
-                    max_length=max_length,
-                    temperature=temperature,
-                    top_k=top_k,
-                    top_p=top_p,
-                    do_sample=True,
-                    pad_token_id=tokenizer.eos_token_id
-                )
-            else:  # T5 and BART
-                outputs = model.generate(
-                    inputs['input_ids'],
-                    max_length=max_length,
-                    temperature=temperature,
-                    top_k=top_k,
-                    top_p=top_p,
-                    do_sample=True,
-                    num_beams=4,
-                    early_stopping=True
-                )
+            outputs = model.generate(
+                inputs['input_ids'],
+                return_dict_in_generate=True,
+                **self._cached_prompt_kwargs(model_name, model, inputs['input_ids']),
+                **self._generation_kwargs(model_name, tokenizer, max_length, temperature, top_k, top_p,
+                                          policy, start)
+            )
+        self._remember_prompt(model_name, model, inputs['input_ids'], outputs)
         
+        # Long generations must not count as idle time
+        model_info['last_used'] = time.monotonic()
+
         # Decode and return the generated text
-        generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        generated_text = tokenizer.decode(outputs.sequences[0], skip_special_tokens=True)
         
         # Clean up the generated text
         if model_name == 'gpt2':
@@ -92,6 +285,200 @@ class StoryGenerator:
         
         return generated_text
 
+    def _generate_speculative(self, prompt, model_name, max_length, temperature, top_k, top_p,
+                              num_draft_tokens):
+        """
+        Speculative decoding: the draft model proposes tokens, the target
+        verifies them in one forward pass. Samples follow the same
+        temperature / top-k / top-p distribution as plain sampling.
+        """
+        model_info = self._load_model(model_name)
+        draft_info = self._load_model(DRAFT_MODELS[model_name])
+        model, tokenizer = model_info['model'], model_info['tokenizer']
+
+        # An empty prompt starts from GPT-2's <|endoftext|> token, as generate() does
+        prompt_ids = tokenizer(prompt)['input_ids'] or [tokenizer.bos_token_id]
+        max_new_tokens = min(max_length, model.config.n_positions) - len(prompt_ids)
+        if max_new_tokens <= 0:
+            return ""
+
+        generated = speculative_generate(
+            model, draft_info['model'], prompt_ids, max_new_tokens,
+            temperature=temperature, top_k=top_k, top_p=top_p,
+            num_draft_tokens=num_draft_tokens, eos_token_id=tokenizer.eos_token_id,
+            stats=self.speculation_stats
+        )
+        model_info['last_used'] = draft_info['last_used'] = time.monotonic()
+        return tokenizer.decode(generated, skip_special_tokens=True).strip()
+
+    def speculation_report(self):
+        """Acceptance-rate metrics of speculative decoding so far"""
+        return self.speculation_stats.as_dict()
+
+    def generate_story_stream(self, prompt, model_name='gpt2', max_length=500,
+                              temperature=0.7, top_k=50, top_p=0.9, policy=None):
+        """
+        Generate a story like `generate_story`, yielding text as tokens are produced.
+
+        Detokenization is incremental (TextIteratorStreamer decodes the running
+        token sequence and only emits text once it is stable), so multi-token
+        characters from GPT-2 BPE and SentencePiece pieces come out correctly.
+        Streaming needs a single hypothesis, so FLAN-T5 and BART always
+        sample with one beam here; the policy's budgets still apply.
+
+        Yields:
+            str: Successive pieces of the story; joined they form the full text
+        """
+        model_info = self._load_model(model_name)
+        # The time budget covers generation, not a first-use model load
+        start = time.time()
+        model = model_info['model']
+        tokenizer = model_info['tokenizer']
+
+        prompt = self._format_prompt(prompt, model_name)
+        inputs = tokenizer(prompt, return_tensors='pt').to(self.device)
+
+        kwargs = self._generation_kwargs(model_name, tokenizer, max_length, temperature, top_k, top_p,
+                                         policy, start)
+        kwargs.update(num_beams=1, do_sample=True)
+        kwargs.pop('early_stopping', None)
+        kwargs.pop('length_penalty', None)
+
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def run():
+            try:
+                with torch.no_grad():
+                    outputs = model.generate(
+                        inputs['input_ids'],
+                        streamer=streamer,
+                        return_dict_in_generate=True,
+                        **self._cached_prompt_kwargs(model_name, model, inputs['input_ids']),
+                        **kwargs
+                    )
+                self._remember_prompt(model_name, model, inputs['input_ids'], outputs)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()  # unblock the consumer
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        for text in streamer:
+            yield text
+        thread.join()
+
+        model_info['last_used'] = time.monotonic()
+        if errors:
+            raise errors[0]
+
+    def _available_memory(self):
+        """Free memory in bytes on the generation device"""
+        if self.device.type == 'cuda':
+            return torch.cuda.mem_get_info(self.device)[0]
+        try:
+            return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (ValueError, OSError, AttributeError):
+            return 2 * 1024 ** 3
+
+    def _auto_batch_size(self, model, max_length, rows_per_prompt, max_batch_size=32):
+        """
+        Number of prompts per generate call that fits in half the free memory.
+
+        The estimate is dominated by the key/value cache: two tensors per
+        layer of hidden_size values per token, for every sequence in the batch
+        (beams and samples included), plus one row of vocabulary logits.
+        """
+        config = model.config
+        layers = getattr(config, 'n_layer', None) or getattr(config, 'num_layers', None) or config.decoder_layers
+        hidden = getattr(config, 'n_embd', None) or config.d_model
+        if config.is_encoder_decoder:
+            layers *= 2  # cross-attention keys/values
+        bytes_per_value = next(model.parameters()).element_size()
+
+        per_sequence = (2 * layers * hidden * max_length + config.vocab_size) * bytes_per_value
+        budget = self._available_memory() // 2
+        return max(1, min(max_batch_size, budget // (per_sequence * rows_per_prompt)))
+
+    def generate_batch(self, prompts, model_name='gpt2', num_samples=1, max_length=500,
+                       temperature=0.7, top_k=50, top_p=0.9, batch_size=None, policy=None):
+        """
+        Generate `num_samples` stories for each of many prompts.
+
+        Prompts are sorted by token length, padded per micro-batch (on the left
+        for GPT-2) and each micro-batch is a single generate call returning all
+        samples of its prompts. If a micro-batch runs out of memory it is split
+        in half and retried.
+
+        Args:
+            prompts (list of str): Story prompts
+            model_name (str): Name of the model to use ('gpt2', 'flan-t5', or 'bart')
+            num_samples (int): Stories to generate per prompt
+            max_length (int): Maximum length of each generated story
+            temperature (float): Sampling temperature
+            top_k (int): Top-k sampling parameter
+            top_p (float): Top-p (nucleus) sampling parameter
+            batch_size (int or None): Prompts per generate call; None picks
+                one from the free memory
+            policy (DecodingPolicy or None): Beam width and budgets for
+                FLAN-T5 and BART; the time budget applies to each micro-batch
+
+        Returns:
+            list of dict: One {'prompt': str, 'stories': list of str} per
+            prompt, in input order
+        """
+        model_info = self._load_model(model_name)
+        model = model_info['model']
+        tokenizer = model_info['tokenizer']
+
+        formatted = [self._format_prompt(prompt, model_name) for prompt in prompts]
+
+        def batch_kwargs():
+            kwargs = self._generation_kwargs(model_name, tokenizer, max_length, temperature, top_k, top_p,
+                                             policy, time.time())
+            kwargs['num_return_sequences'] = num_samples
+            if num_samples > 1 and kwargs.get('num_beams', 1) > 1:
+                # Plain beam search would return the same top beams for every sample
+                kwargs['do_sample'] = True
+                kwargs['num_beams'] = max(kwargs['num_beams'], num_samples)
+            return kwargs
+
+        kwargs = batch_kwargs()
+        if batch_size is None:
+            batch_size = self._auto_batch_size(model, max_length, num_samples * kwargs.get('num_beams', 1))
+
+        lengths = [len(ids) for ids in tokenizer(formatted)['input_ids']]
+        order = sorted(range(len(prompts)), key=lambda i: lengths[i], reverse=True)
+        pending = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+        stories = [None] * len(prompts)
+
+        while pending:
+            batch = pending.pop(0)
+            inputs = tokenizer([formatted[i] for i in batch], return_tensors='pt', padding=True).to(self.device)
+            try:
+                with torch.no_grad():
+                    outputs = model.generate(
+                        inputs['input_ids'], attention_mask=inputs['attention_mask'], **batch_kwargs()
+                    )
+            except RuntimeError as e:
+                if 'out of memory' not in str(e).lower() or len(batch) == 1:
+                    raise
+                if self.device.type == 'cuda':
+                    torch.cuda.empty_cache()
+                half = len(batch) // 2
+                pending[:0] = [batch[:half], batch[half:]]
+                continue
+
+            if not model.config.is_encoder_decoder:
+                # Drop the (left-padded) prompt tokens
+                outputs = outputs[:, inputs['input_ids'].shape[1]:]
+            texts = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            for row, i in enumerate(batch):
+                stories[i] = [text.strip() for text in texts[row * num_samples:(row + 1) * num_samples]]
+
+        model_info['last_used'] = time.monotonic()
+        return [{'prompt': prompt, 'stories': samples} for prompt, samples in zip(prompts, stories)]
+
     def get_available_models(self):
         """Return list of available models"""
-        return list(self.models.keys()) 
\ No newline at end of file
+        return list(MODEL_SPECS) 
\ No newline at end of file
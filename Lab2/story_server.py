@@ -0,0 +1,349 @@
+"""
+Local story generation server with continuous batching.
+
+Concurrent GPT-2 requests share decoding steps: every step runs one forward
+pass for all in-flight stories, new requests are admitted between steps and
+finished stories leave the batch immediately. FLAN-T5 and BART requests are
+served one at a time through StoryGenerator.generate_story.
+
+Usage:
+    python story_server.py --port 8000
+    python story_server.py --unix-socket /tmp/story.sock
+
+    curl -X POST localhost:8000/generate -d '{"prompt": "A dragon who hates gold"}'
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from kv_cache import build_cache, cache_layers, left_pad_layers
+from sampling import sample_next_token
+from story_generator import StoryGenerator
+
+
+class _Sequence:
+    """One in-flight story"""
+
+    def __init__(self, prompt, max_length, temperature, top_k, top_p, future):
+        self.prompt = prompt
+        self.max_length = max_length
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.future = future
+        self.tokens = []  # generated token ids; the last one is not in the KV cache yet
+        self.max_new_tokens = 0
+
+    def sample(self, logits):
+        return int(sample_next_token(logits, self.temperature, self.top_k, self.top_p))
+
+
+class ContinuousBatcher:
+    """
+    Continuous batching of GPT-2 decoding on top of StoryGenerator.
+
+    The batch keeps one left-padded key/value cache for all active sequences
+    plus an attention mask that hides the padding. All model work runs on a
+    single worker thread, so the asyncio loop stays responsive.
+
+    Args:
+        generator (StoryGenerator): Provides the model and tokenizer
+        max_batch_size (int): Maximum number of sequences decoded together
+    """
+
+    def __init__(self, generator, max_batch_size=16):
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue()
+        self.active = []
+        self.layers = None
+        self.attention_mask = None
+        self.tokens_generated = 0
+        self.started = time.monotonic()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='decode')
+
+    async def submit(self, prompt, max_length=500, temperature=0.7, top_k=50, top_p=0.9):
+        """Queue a request and wait for the finished story"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(_Sequence(prompt, max_length, temperature, top_k, top_p, future))
+        return await future
+
+    async def run(self):
+        """Decode forever: admit queued requests, run one step, resolve finished ones"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.active:
+                # Idle: block until a request arrives
+                admitted = [await self.queue.get()]
+            else:
+                admitted = []
+            while len(self.active) + len(admitted) < self.max_batch_size and not self.queue.empty():
+                admitted.append(self.queue.get_nowait())
+
+            try:
+                finished, failed = await loop.run_in_executor(self._worker, self._step, admitted)
+            except Exception as e:
+                # The shared step failed: fail every in-flight request and start again with an empty batch
+                for seq in self.active + admitted:
+                    if not seq.future.done():
+                        seq.future.set_exception(e)
+                self.active, self.layers, self.attention_mask = [], None, None
+                continue
+
+            for seq, text in finished:
+                if not seq.future.done():
+                    seq.future.set_result(text)
+            for seq, e in failed:
+                if not seq.future.done():
+                    seq.future.set_exception(e)
+
+    def _step(self, admitted):
+        """Admit new sequences, then run one shared decoding step (worker thread)"""
+        model_info = self.generator._load_model('gpt2')
+        model, tokenizer = model_info['model'], model_info['tokenizer']
+        finished, failed = [], []
+
+        with torch.no_grad():
+            for seq in admitted:
+                try:
+                    self._admit(seq, model, tokenizer, finished)
+                except Exception as e:
+                    # Only this sequence fails; the batch is untouched until the merge succeeds
+                    failed.append((seq, e))
+
+            if self.active:
+                self._decode(model, tokenizer, finished)
+
+        model_info['last_used'] = time.monotonic()
+        return finished, failed
+
+    def _admit(self, seq, model, tokenizer, finished):
+        """Prefill a new sequence on its own and merge its cache into the batch"""
+        device = self.generator.device
+        input_ids = tokenizer(seq.prompt, return_tensors='pt')['input_ids'].to(device)
+        prompt_length = input_ids.size(1)
+        seq.max_new_tokens = min(seq.max_length, model.config.n_positions) - prompt_length
+        if seq.max_new_tokens <= 0:
+            finished.append((seq, ""))
+            return
+
+        outputs = model(input_ids=input_ids, use_cache=True)
+        seq.tokens.append(seq.sample(outputs.logits[0, -1]))
+        self.tokens_generated += 1
+        if self._is_done(seq, tokenizer):
+            finished.append((seq, self._text(seq, tokenizer)))
+            return
+
+        layers = cache_layers(outputs.past_key_values)
+        mask = torch.ones(1, prompt_length, dtype=torch.long, device=device)
+        if self.layers is not None:
+            length = max(self.attention_mask.size(1), prompt_length)
+            old = left_pad_layers(self.layers, length)
+            new = left_pad_layers(layers, length)
+            layers = [
+                (torch.cat([old_k, new_k]), torch.cat([old_v, new_v]))
+                for (old_k, old_v), (new_k, new_v) in zip(old, new)
+            ]
+            mask = torch.cat([
+                self._left_pad_mask(self.attention_mask, length),
+                self._left_pad_mask(mask, length)
+            ])
+        # Swap in the merged cache only once all of it was built
+        self.layers, self.attention_mask = layers, mask
+        self.active.append(seq)
+
+    def _decode(self, model, tokenizer, finished):
+        """One forward pass for every active sequence"""
+        device = self.generator.device
+        input_ids = torch.tensor([[seq.tokens[-1]] for seq in self.active], device=device)
+        self.attention_mask = torch.cat(
+            [self.attention_mask, self.attention_mask.new_ones(len(self.active), 1)], dim=1
+        )
+        # Positions count real tokens only, so left padding does not shift them
+        position_ids = self.attention_mask.sum(dim=1, keepdim=True) - 1
+
+        outputs = model(
+            input_ids=input_ids,
+            past_key_values=build_cache(self.layers),
+            attention_mask=self.attention_mask,
+            position_ids=position_ids,
+            use_cache=True
+        )
+        self.layers = cache_layers(outputs.past_key_values)
+
+        keep = []
+        for row, seq in enumerate(self.active):
+            seq.tokens.append(seq.sample(outputs.logits[row, -1]))
+            self.tokens_generated += 1
+            if self._is_done(seq, tokenizer):
+                finished.append((seq, self._text(seq, tokenizer)))
+            else:
+                keep.append(row)
+
+        if len(keep) < len(self.active):
+            self._evict(keep)
+
+    def _evict(self, keep):
+        """Drop finished rows from the batch and trim padding no row needs any more"""
+        self.active = [self.active[row] for row in keep]
+        if not self.active:
+            self.layers, self.attention_mask = None, None
+            return
+
+        index = torch.tensor(keep, device=self.attention_mask.device)
+        mask = self.attention_mask.index_select(0, index)
+        # Leading columns that are padding in every remaining row
+        unused = int((mask.sum(dim=0) == 0).long().cumprod(dim=0).sum())
+        self.attention_mask = mask[:, unused:]
+        self.layers = [
+            (key.index_select(0, index)[:, :, unused:], value.index_select(0, index)[:, :, unused:])
+            for key, value in self.layers
+        ]
+
+    @staticmethod
+    def _left_pad_mask(mask, length):
+        return torch.cat([mask.new_zeros(mask.size(0), length - mask.size(1)), mask], dim=1)
+
+    @staticmethod
+    def _is_done(seq, tokenizer):
+        return seq.tokens[-1] == tokenizer.eos_token_id or len(seq.tokens) >= seq.max_new_tokens
+
+    @staticmethod
+    def _text(seq, tokenizer):
+        return tokenizer.decode(seq.tokens, skip_special_tokens=True).strip()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'active': len(self.active),
+            'queued': self.queue.qsize(),
+            'tokens_generated': self.tokens_generated,
+            'tokens_per_sec': round(self.tokens_generated / elapsed, 2) if elapsed else 0.0
+        }
+
+
+class StoryServer:
+    """Minimal HTTP/1.1 front end: POST /generate, GET /stats"""
+
+    def __init__(self, generator, max_batch_size=16):
+        self.generator = generator
+        self.batcher = ContinuousBatcher(generator, max_batch_size=max_batch_size)
+        # Encoder-decoder models do not share steps; serve them one at a time
+        self._seq2seq_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='seq2seq')
+
+    @staticmethod
+    def _number(request, name, default, integer=False):
+        """A finite JSON number (an integer if `integer`); ValueError otherwise"""
+        value = request.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"'{name}' must be a number")
+        if integer and value != int(value):
+            raise ValueError(f"'{name}' must be an integer")
+        return int(value) if integer else float(value)
+
+    def _params(self, request):
+        """Validate the generation parameters before anything is queued"""
+        if not isinstance(request.get('prompt'), str) or not request['prompt']:
+            raise ValueError("'prompt' must be a non-empty string")
+        if not isinstance(request.get('model_name', 'gpt2'), str):
+            raise ValueError("'model_name' must be a string")
+        params = {
+            'max_length': self._number(request, 'max_length', 500, integer=True),
+            'temperature': self._number(request, 'temperature', 0.7),
+            'top_k': self._number(request, 'top_k', 50, integer=True),
+            'top_p': self._number(request, 'top_p', 0.9)
+        }
+        if params['max_length'] <= 0:
+            raise ValueError("'max_length' must be positive")
+        if params['temperature'] <= 0:
+            raise ValueError("'temperature' must be positive")
+        if params['top_k'] < 0:
+            raise ValueError("'top_k' must not be negative")
+        if not 0 < params['top_p'] <= 1:
+            raise ValueError("'top_p' must be in (0, 1]")
+        return params
+
+    async def generate(self, request):
+        params = self._params(request)
+        model_name = request.get('model_name', 'gpt2')
+        if model_name == 'gpt2':
+            return await self.batcher.submit(request['prompt'], **params)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._seq2seq_worker,
+            lambda: self.generator.generate_story(request['prompt'], model_name=model_name, **params)
+        )
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            if len(request_line) < 2:
+                status, payload = 400, {'error': 'malformed request'}
+            elif request_line[:2] == ['POST', '/generate']:
+                try:
+                    request = json.loads(body or b'{}')
+                    if not isinstance(request, dict):
+                        status, payload = 400, {'error': 'request body must be a JSON object'}
+                    else:
+                        status, payload = 200, {'story': await self.generate(request)}
+                except (ValueError, KeyError) as e:
+                    status, payload = 400, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+            elif request_line[:2] == ['GET', '/stats']:
+                status, payload = 200, self.batcher.stats()
+            else:
+                status, payload = 404, {'error': 'not found'}
+
+            data = json.dumps(payload).encode('utf-8')
+            reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[status]
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('latin-1') + data
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000, unix_socket=None):
+        batch_task = asyncio.create_task(self.batcher.run())
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+            print(f"Story server listening on {unix_socket}")
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f"Story server listening on http://{host}:{port}")
+        async with server:
+            await asyncio.gather(server.serve_forever(), batch_task)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuous-batching story generation server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', help="Listen on a Unix socket instead of TCP")
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    args = parser.parse_args()
+
+    generator = StoryGenerator(warmup=('gpt2',))
+    server = StoryServer(generator, max_batch_size=args.max_batch_size)
+    asyncio.run(server.serve(args.host, args.port, args.unix_socket))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,12 @@
 import streamlit as st
 import os
 from utils.pdf_utils import extract_text_from_pdf
-from utils.stt import transcribe_audio
-from utils.tts import speak
-from models.english_qa import answer_english
-from models.indic_qa import answer_hindi
-from models.international_qa import answer_french
+from utils.pdf_cache import get_pdf_cache
+from utils.stt import WHISPER_SIZES, transcribe_stream
+from utils.tts import get_tts_service
+from models.dispatch import answer_all
 import tempfile
+import uuid
 
 # Set page config
 st.set_page_config(
@@ -59,6 +59,8 @@ if 'answers' not in st.session_state:
     st.session_state.answers = {}
 if 'show_answers' not in st.session_state:
     st.session_state.show_answers = False
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 def load_pdf_texts():
     """Load text from PDF files"""
@@ -84,6 +86,16 @@ def load_pdf_texts():
     return texts
 
 
+def render_tts(text, lang, label):
+    """Synthesize `text` (served from the TTS cache when repeated) and play it"""
+    with st.spinner("Generating speech..."):
+        try:
+            service = get_tts_service()
+            audio_bytes = service.synthesize(text, lang=lang)
+            st.audio(audio_bytes, format=service.mime)
+            st.success(f"🎵 {label} audio generated!")
+        except Exception as e:
+            st.error(f"TTS Error: {str(e)}")
 
 # Main app
 def main():
@@ -105,6 +117,8 @@ def main():
         if st.button("🔄 Load PDF Documents"):
             with st.spinner("Loading PDF documents..."):
                 st.session_state.pdf_texts = load_pdf_texts()
+        cache_stats = get_pdf_cache().stats()
+        st.caption(f"PDF text cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
     
     # Load PDFs if not already loaded
     if not st.session_state.pdf_texts:
@@ -127,6 +141,12 @@ def main():
             st.session_state.question = question
     
     with tab2:
+        whisper_size = st.selectbox(
+            "Whisper model size",
+            WHISPER_SIZES,
+            index=WHISPER_SIZES.index("base"),
+            help="Smaller models transcribe faster, larger ones more accurately"
+        )
         uploaded_audio = st.file_uploader(
             "Upload an audio file (WAV format)",
             type=['wav'],
@@ -141,7 +161,14 @@ def main():
             
             try:
                 with st.spinner("🔊 Transcribing audio..."):
-                    transcribed_question = transcribe_audio(temp_audio_path)
+                    # Show partial text as each audio window is transcribed
+                    partial = st.empty()
+                    parts = []
+                    for text in transcribe_stream(temp_audio_path, model_size=whisper_size):
+                        parts.append(text)
+                        partial.info(f"📝 {' '.join(parts)}")
+                    transcribed_question = " ".join(parts)
+                    partial.empty()
                     st.session_state.question = transcribed_question
                     st.success(f"📝 Transcribed: {transcribed_question}")
             except Exception as e:
@@ -156,38 +183,25 @@ def main():
         question = st.session_state.question
         st.session_state.show_answers = True
 
-        # Generate answers and store in session state
-        with st.spinner("🧠 Processing your question in all languages..."):
-            answers = {}
-
-            # English Answer
-            if st.session_state.pdf_texts.get('English'):
-                try:
-                    answers['english'] = answer_english(question, st.session_state.pdf_texts['English'])
-                except Exception as e:
-                    answers['english'] = f"Error: {e}"
-            else:
-                answers['english'] = "English PDF not available"
-
-            # Malayalam Answer
-            if st.session_state.pdf_texts.get('Hindi'):
-                try:
-                    answers['hindi'] = answer_hindi(question, st.session_state.pdf_texts['Hindi'])
-                except Exception as e:
-                    answers['hindi'] = f"Error: {e}"
-            else:
-                answers['hindi'] = "Hindi PDF not available"
-
-            # French Answer
-            if st.session_state.pdf_texts.get('French'):
-                try:
-                    answers['french'] = answer_french(question, st.session_state.pdf_texts['French'])
-                except Exception as e:
-                    answers['french'] = f"Error: {e}"
-            else:
-                answers['french'] = "French PDF not available"
-
-            st.session_state.answers = answers
+        # Run all language backends concurrently and show each answer as soon as it is ready
+        st.header("🤖 AI Responses")
+        placeholders = {}
+        for language, column in zip(['english', 'hindi', 'french'], st.columns(3)):
+            placeholders[language] = column.empty()
+            placeholders[language].info(f"🧠 Answering in {language.capitalize()}...")
+
+        answers = {}
+        for language, answer in answer_all(question, st.session_state.pdf_texts,
+                                session=st.session_state.session_id):
+            answers[language] = answer
+            placeholders[language].markdown(
+                f'<div class="answer-box"><strong>{language.capitalize()}:</strong> {answer}</div>',
+                unsafe_allow_html=True
+            )
+
+        st.session_state.answers = answers
+        # Re-render with the full answer layout (including audio buttons)
+        st.rerun()
 
     # Display answers if available
     if st.session_state.show_answers and st.session_state.answers:
@@ -214,36 +228,7 @@ def main():
 
                 # Generate TTS for English
                 if st.button("🔊 Generate English Audio", key="en_audio"):
-                    with st.spinner("Generating speech..."):
-                        try:
-                            from gtts import gTTS
-                            import tempfile
-                            import time
-
-                            # Create temporary file
-                            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                                temp_path = tmp_file.name
-
-                            # Generate TTS
-                            tts = gTTS(text=english_answer, lang='en')
-                            tts.save(temp_path)
-
-                            # Read the audio file
-                            with open(temp_path, 'rb') as audio_file:
-                                audio_bytes = audio_file.read()
-
-                            st.audio(audio_bytes, format='audio/mp3')
-                            st.success("🎵 English audio generated!")
-
-                            # Clean up with retry mechanism
-                            try:
-                                time.sleep(0.1)  # Small delay
-                                os.unlink(temp_path)
-                            except:
-                                pass  # Ignore cleanup errors
-
-                        except Exception as e:
-                            st.error(f"TTS Error: {str(e)}")
+                    render_tts(english_answer, lang='en', label="English")
             else:
                 st.warning("⚠️ English answer not available")
 
@@ -260,36 +245,7 @@ def main():
 
                 # Generate TTS for Malayalam
                 if st.button("🔊 Generate Hindi Audio", key="ml_audio"):
-                    with st.spinner("Generating speech..."):
-                        try:
-                            from gtts import gTTS
-                            import tempfile
-                            import time
-
-                            # Create temporary file
-                            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                                temp_path = tmp_file.name
-
-                            # Generate TTS
-                            tts = gTTS(text=hindi_ans, lang='ml')
-                            tts.save(temp_path)
-
-                            # Read the audio file
-                            with open(temp_path, 'rb') as audio_file:
-                                audio_bytes = audio_file.read()
-
-                            st.audio(audio_bytes, format='audio/mp3')
-                            st.success("🎵 Hindi audio generated!")
-
-                            # Clean up with retry mechanism
-                            try:
-                                time.sleep(0.1)  # Small delay
-                                os.unlink(temp_path)
-                            except:
-                                pass  # Ignore cleanup errors
-
-                        except Exception as e:
-                            st.error(f"TTS Error: {str(e)}")
+                    render_tts(hindi_ans, lang='hi', label="Hindi")
             else:
                 st.warning("⚠️Hindi answer not available")
 
@@ -306,36 +262,7 @@ def main():
 
                 # Generate TTS for French
                 if st.button("🔊 Generate French Audio", key="fr_audio"):
-                    with st.spinner("Generating speech..."):
-                        try:
-                            from gtts import gTTS
-                            import tempfile
-                            import time
-
-                            # Create temporary file
-                            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                                temp_path = tmp_file.name
-
-                            # Generate TTS
-                            tts = gTTS(text=french_answer, lang='fr')
-                            tts.save(temp_path)
-
-                            # Read the audio file
-                            with open(temp_path, 'rb') as audio_file:
-                                audio_bytes = audio_file.read()
-
-                            st.audio(audio_bytes, format='audio/mp3')
-                            st.success("🎵 French audio generated!")
-
-                            # Clean up with retry mechanism
-                            try:
-                                time.sleep(0.1)  # Small delay
-                                os.unlink(temp_path)
-                            except:
-                                pass  # Ignore cleanup errors
-
-                        except Exception as e:
-                            st.error(f"TTS Error: {str(e)}")
+                    render_tts(french_answer, lang='fr', label="French")
             else:
                 st.warning("⚠️ French answer not available")
 
@@ -2,9 +2,7 @@ from utils.pdf_utils import extract_text_from_pdf
 from utils.stt import transcribe_audio
 from utils.tts import speak
 
-from models.english_qa import answer_english
-from models.indic_qa import answer_hindi
-from models.international_qa import answer_french
+from models.dispatch import answer_all
 
 # Step 1: Load PDF content
 eng_text = extract_text_from_pdf("sample_docs/english solar.pdf")
@@ -22,26 +20,16 @@ else:
     question = input("Your question: ")
     print("📥 Question:", question)
 
-# Step 3: Answer in English
-print("\n🧠 Answering in English...")
-eng_answer = answer_english(question, eng_text)
-print("✅ English Answer:", eng_answer)
-audio_file = speak(eng_answer, lang='en', filename='english_answer.mp3')
-if audio_file:
-    print("🎵 English audio saved as:", audio_file)
+# Step 3: Answer in all languages concurrently, printing each answer as it arrives
+print("\n🧠 Answering in English, Hindi and French...")
+pdf_texts = {'English': eng_text, 'Hindi': ml_text, 'French': fr_text}
+answers = {}
+for language, answer in answer_all(question, pdf_texts):
+    answers[language] = answer
+    print(f"✅ {language.capitalize()} Answer:", answer)
 
-# Step 4: Answer in Malayalam
-print("\n🧠 Answering in Hindi...")
-ml_answer = answer_hindi(question, ml_text)
-print("✅ Hindi Answer:", ml_answer)
-audio_file = speak(ml_answer, lang='ml', filename='malayalam_answer.mp3')
-if audio_file:
-    print("🎵 Hindi audio saved as:", audio_file)
-
-# Step 5: Answer in French
-print("\n🧠 Answering in French...")
-fr_answer = answer_french(question, fr_text)
-print("✅ French Answer:", fr_answer)
-audio_file = speak(fr_answer, lang='fr', filename='french_answer.mp3')
-if audio_file:
-    print("🎵 French audio saved as:", audio_file)
+# Step 4: Speak the answers once all backends have finished
+for language, lang_code in [('english', 'en'), ('hindi', 'hi'), ('french', 'fr')]:
+    audio_file = speak(answers[language], lang=lang_code, filename=f'{language}_answer.mp3')
+    if audio_file:
+        print(f"🎵 {language.capitalize()} audio saved as:", audio_file)
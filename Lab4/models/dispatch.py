@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import torch
+
+from models.english_qa import answer_english
+from models.indic_qa import answer_hindi
+from models.international_qa import answer_french
+
+# language -> (backend, name of the PDF text it answers from)
+BACKENDS = {
+    "english": (answer_english, "English"),
+    "hindi": (answer_hindi, "Hindi"),
+    "french": (answer_french, "French"),
+}
+
+DEFAULT_TIMEOUT_S = 120
+# How long a question may wait for a free worker before it is dropped
+DEFAULT_QUEUE_TIMEOUT_S = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# session id -> futures of that session's latest question
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _get_executor():
+    """
+    Shared, bounded pool with one worker per backend.
+
+    When the pool is first created (not at import), torch's intra-op
+    threads are split evenly between the backends, so running them
+    concurrently does not oversubscribe the cores.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // len(BACKENDS)))
+            _executor = ThreadPoolExecutor(max_workers=len(BACKENDS), thread_name_prefix="qa-backend")
+        return _executor
+
+
+def _run_backend(language, question, context, started):
+    started.append(time.monotonic())
+    backend, _ = BACKENDS[language]
+    try:
+        return backend(question, context)
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def _cancel_queued(futures):
+    """Drop work that has not started yet; running backends cannot be interrupted"""
+    for future in futures:
+        future.cancel()
+
+
+def answer_all(question, pdf_texts, timeouts=None, session=None, queue_timeout=DEFAULT_QUEUE_TIMEOUT_S):
+    """
+    Answer a question with every language backend concurrently.
+
+    Parameters:
+        question (str): The question.
+        pdf_texts (dict): PDF name ('English', 'Hindi', 'French') -> document text.
+        timeouts (dict or None): language -> seconds a backend may run once it
+            has started; missing languages use DEFAULT_TIMEOUT_S.
+        session (str or None): Caller's session id. A new question cancels the
+            session's previous questions that are still queued.
+        queue_timeout (float): Seconds a backend may wait for a free worker.
+
+    Yields:
+        tuple[str, str]: (language, answer) in completion order. A backend that
+        exceeds its timeout yields a timeout message instead of its answer.
+    """
+    timeouts = timeouts or {}
+    executor = _get_executor()
+    submitted = time.monotonic()
+
+    pending = {}
+    for language, (_, pdf_name) in BACKENDS.items():
+        context = pdf_texts.get(pdf_name)
+        if not context:
+            yield language, f"{pdf_name} PDF not available"
+            continue
+        started = []
+        future = executor.submit(_run_backend, language, question, context, started)
+        pending[future] = (language, started)
+
+    futures = list(pending)
+    if session is not None:
+        with _sessions_lock:
+            _cancel_queued(_sessions.get(session, ()))
+            _sessions[session] = futures
+
+    def deadline(language, started):
+        # Timeouts count from when the backend starts, not from when it was queued
+        if started:
+            return started[0] + timeouts.get(language, DEFAULT_TIMEOUT_S)
+        return submitted + queue_timeout
+
+    try:
+        while pending:
+            next_deadline = min(deadline(*entry) for entry in pending.values())
+            done, _ = wait(pending, timeout=max(0, next_deadline - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                language, _ = pending.pop(future)
+                if future.cancelled():
+                    yield language, "Cancelled by a newer question"
+                else:
+                    yield language, future.result()
+
+            now = time.monotonic()
+            for future, (language, started) in list(pending.items()):
+                if deadline(language, started) > now:
+                    continue
+                del pending[future]
+                if future.cancel():
+                    yield language, f"Busy: not started within {queue_timeout:.0f}s"
+                elif started:
+                    # A running thread cannot be stopped; its result is discarded
+                    yield language, f"Timed out after {now - started[0]:.0f}s"
+                else:
+                    # Started between the deadline check and cancel(); give it its full timeout
+                    pending[future] = (language, [now])
+    finally:
+        # The caller stopped listening (e.g. a Streamlit rerun): free the queue
+        _cancel_queued(pending)
+        if session is not None:
+            with _sessions_lock:
+                if _sessions.get(session) is futures:
+                    del _sessions[session]
@@ -1,17 +1,64 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import AutoModelForSeq2SeqLM
 import torch
 
-def answer_english(question, context):
-    """Answer questions in English using FLAN-T5"""
+from models.qa_utils import length_sorted_batches
+from models.registry import load_pretrained
+from models.retrieval import retrieve
+
+MODEL_NAME = "google/flan-t5-base"
+
+def _build_prompt(question, context, top_k=3):
+    """
+    Build the FLAN-T5 prompt from the passages of `context` most relevant to the question.
+
+    The question comes before the passages, so truncating a long prompt to
+    512 tokens cuts the end of the context rather than the question.
+    """
+    passages = "\n".join(retrieve(question, context, top_k=top_k))
+    return f"Answer the question based on the context.\nQuestion: {question}\nContext: {passages}"
+
+def answer_english(question, context, top_k=3):
+    """Answer questions in English using FLAN-T5 over the top-k retrieved passages"""
     try:
-        print("Loading English model...")
-        tokenizer = AutoTokenizer.from_pretrained("google/flan-t5-base")
-        model = AutoModelForSeq2SeqLM.from_pretrained("google/flan-t5-base")
+        tokenizer, model = load_pretrained(MODEL_NAME, AutoModelForSeq2SeqLM)
 
-        prompt = f"Answer the question based on the context.\nContext: {context[:1000]}\nQuestion: {question}"
+        prompt = _build_prompt(question, context, top_k)
         inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
-        outputs = model.generate(**inputs, max_length=128)
+        with torch.no_grad():
+            outputs = model.generate(**inputs, max_length=128)
         return tokenizer.decode(outputs[0], skip_special_tokens=True)
     except Exception as e:
         print(f"Error in English QA: {e}")
         return f"Sorry, I couldn't process your question in English. Error: {e}"
+
+def answer_english_batch(pairs, batch_size=8, top_k=3):
+    """
+    Answer many English (question, context) pairs with batched FLAN-T5 generation.
+
+    Prompts are sorted by token length and padded per micro-batch, so each
+    micro-batch is a single `generate` call with little padding waste.
+
+    Returns:
+        list[str]: Answers in the same order as `pairs`.
+    """
+    try:
+        tokenizer, model = load_pretrained(MODEL_NAME, AutoModelForSeq2SeqLM)
+
+        prompts = [_build_prompt(question, context, top_k) for question, context in pairs]
+        lengths = [len(ids) for ids in tokenizer(prompts, truncation=True, max_length=512)["input_ids"]]
+        answers = [None] * len(prompts)
+
+        for batch in length_sorted_batches(lengths, batch_size):
+            inputs = tokenizer(
+                [prompts[i] for i in batch],
+                return_tensors="pt", truncation=True, max_length=512, padding=True
+            )
+            with torch.no_grad():
+                outputs = model.generate(**inputs, max_length=128)
+            for i, answer in zip(batch, tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                answers[i] = answer
+
+        return answers
+    except Exception as e:
+        print(f"Error in English QA: {e}")
+        return [f"Sorry, I couldn't process your question in English. Error: {e}"] * len(pairs)
@@ -1,10 +1,10 @@
-from transformers import AutoTokenizer, AutoModelForQuestionAnswering
-import torch
+from transformers import AutoModelForQuestionAnswering
 
-# Load once globally (Hindi model)
+from models.qa_utils import exceeds_max_length, extract_answer_batch, extract_answer_windowed
+from models.registry import load_pretrained
+
+# Loaded lazily through the shared model registry on the first Hindi question
 model_name_hi = "ai4bharat/indic-bert"
-tokenizer_hi = AutoTokenizer.from_pretrained(model_name_hi)
-model_hi = AutoModelForQuestionAnswering.from_pretrained(model_name_hi)
 
 # Base Hindi context
 base_context_hi = """
@@ -15,7 +15,13 @@ base_context_hi = """
 शनि के चारों ओर सुंदर वलय होते हैं और बृहस्पति सबसे बड़ा ग्रह है।
 """
 
-def answer_hindi(question, extra_context=None, lang="hi"):
+def _combine_context(extra_context):
+    """Append extra context (if any) to the base Hindi context"""
+    if extra_context:
+        return f"{base_context_hi.strip()}\n{extra_context.strip()}"
+    return base_context_hi
+
+def answer_hindi(question, extra_context=None, lang="hi", windowed=None, doc_stride=128, max_answer_length=30):
     """
     Answer Hindi questions using IndicBERTv2 QA model.
 
@@ -23,35 +29,50 @@ def answer_hindi(question, extra_context=None, lang="hi"):
         question (str): Hindi question.
         extra_context (str or None): Additional context to append (optional).
         lang (str): Language code (default is 'hi').
+        windowed (bool or None): Search the whole context in overlapping
+            512-token windows instead of truncating it to the first 512
+            tokens. None (default) windows only contexts that are too long.
+        doc_stride (int): Token overlap between consecutive windows.
+        max_answer_length (int): Longest allowed answer in tokens.
 
     Returns:
         str: Extracted answer from the combined context.
     """
     try:
-        if lang == "hi":
-            tokenizer = tokenizer_hi
-            model = model_hi
-            context = base_context_hi
-        else:
+        if lang != "hi":
             return f"Language '{lang}' not supported yet."
 
-        # Append extra context if provided
-        if extra_context:
-            context = f"{context.strip()}\n{extra_context.strip()}"
+        tokenizer, model = load_pretrained(model_name_hi, AutoModelForQuestionAnswering)
+        context = _combine_context(extra_context)
+        if windowed is None:
+            windowed = tokenizer.is_fast and exceeds_max_length(tokenizer, question, context)
+        if windowed:
+            return extract_answer_windowed(
+                tokenizer, model, question, context,
+                doc_stride=doc_stride, max_answer_length=max_answer_length
+            )
+        return extract_answer_batch(tokenizer, model, [(question, context)])[0]
+    except Exception as e:
+        return f"Error during QA inference: {e}"
 
-        # Tokenize inputs
-        inputs = tokenizer(question, context, return_tensors="pt", truncation=True, max_length=512)
-        with torch.no_grad():
-            outputs = model(**inputs)
+def answer_hindi_batch(pairs, lang="hi", batch_size=16):
+    """
+    Answer many Hindi questions with batched IndicBERT forward passes.
 
-        # Get predicted answer span
-        start_idx = torch.argmax(outputs.start_logits)
-        end_idx = torch.argmax(outputs.end_logits) + 1
+    Parameters:
+        pairs (list[tuple[str, str or None]]): (question, extra_context) pairs.
+        lang (str): Language code (default is 'hi').
+        batch_size (int): Maximum number of pairs per forward pass.
 
-        answer = tokenizer.convert_tokens_to_string(
-            tokenizer.convert_ids_to_tokens(inputs["input_ids"][0][start_idx:end_idx])
-        )
+    Returns:
+        list[str]: Answers in the same order as `pairs`.
+    """
+    try:
+        if lang != "hi":
+            return [f"Language '{lang}' not supported yet."] * len(pairs)
 
-        return answer.strip()
+        tokenizer, model = load_pretrained(model_name_hi, AutoModelForQuestionAnswering)
+        pairs = [(question, _combine_context(extra)) for question, extra in pairs]
+        return extract_answer_batch(tokenizer, model, pairs, batch_size=batch_size)
     except Exception as e:
-        return f"Error during QA inference: {e}"
+        return [f"Error during QA inference: {e}"] * len(pairs)
@@ -37,3 +37,7 @@ def answer_hindi(question, context):
     else:
         # Default fallback answer
         return hindi_answers["solar system"]
+
+def answer_hindi_batch(pairs):
+    """Answer many (question, context) pairs; rule-based, so no batching of model calls is needed"""
+    return [answer_hindi(question, context) for question, context in pairs]
@@ -1,26 +1,42 @@
-from transformers import AutoTokenizer, AutoModelForQuestionAnswering
-import torch
+from transformers import AutoModelForQuestionAnswering
 
-def answer_french(question, context):
-    """Answer questions in French using CamemBERT fine-tuned on FQuAD"""
-    try:
-        print("Loading CamemBERT QA model...")
-
-        model_name = "illuin/camembert-base-fquad"
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForQuestionAnswering.from_pretrained(model_name)
+from models.qa_utils import exceeds_max_length, extract_answer_batch, extract_answer_windowed
+from models.registry import load_pretrained
 
-        inputs = tokenizer(question, context, return_tensors="pt", truncation=True, max_length=512)
-        with torch.no_grad():
-            outputs = model(**inputs)
+MODEL_NAME = "illuin/camembert-base-fquad"
 
-        start_idx = torch.argmax(outputs.start_logits)
-        end_idx = torch.argmax(outputs.end_logits) + 1
+def answer_french(question, context, windowed=None, doc_stride=128, max_answer_length=30):
+    """
+    Answer questions in French using CamemBERT fine-tuned on FQuAD
 
-        answer = tokenizer.convert_tokens_to_string(
-            tokenizer.convert_ids_to_tokens(inputs["input_ids"][0][start_idx:end_idx])
-        )
-        return answer.strip()
+    With `windowed=True` the whole context is searched in overlapping
+    512-token windows instead of being truncated to the first 512 tokens.
+    The default (None) windows only contexts longer than 512 tokens.
+    """
+    try:
+        tokenizer, model = load_pretrained(MODEL_NAME, AutoModelForQuestionAnswering)
+        if windowed is None:
+            windowed = tokenizer.is_fast and exceeds_max_length(tokenizer, question, context)
+        if windowed:
+            return extract_answer_windowed(
+                tokenizer, model, question, context,
+                doc_stride=doc_stride, max_answer_length=max_answer_length
+            )
+        return extract_answer_batch(tokenizer, model, [(question, context)])[0]
     except Exception as e:
         print(f"Error in French QA: {e}")
         return f"Sorry, I couldn't process your question in French. Error: {e}"
+
+def answer_french_batch(pairs, batch_size=16):
+    """
+    Answer many French (question, context) pairs with batched CamemBERT forward passes.
+
+    Returns:
+        list[str]: Answers in the same order as `pairs`.
+    """
+    try:
+        tokenizer, model = load_pretrained(MODEL_NAME, AutoModelForQuestionAnswering)
+        return extract_answer_batch(tokenizer, model, pairs, batch_size=batch_size)
+    except Exception as e:
+        print(f"Error in French QA: {e}")
+        return [f"Sorry, I couldn't process your question in French. Error: {e}"] * len(pairs)
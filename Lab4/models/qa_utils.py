@@ -0,0 +1,142 @@
+import torch
+
+
+def length_sorted_batches(lengths, batch_size):
+    """
+    Group item indices into micro-batches of similar length.
+
+    Parameters:
+        lengths (list[int]): Token length of each item.
+        batch_size (int): Maximum number of items per micro-batch.
+
+    Returns:
+        list[list[int]]: Indices into the original list, longest items first
+        so the heaviest batch runs (and fails, if memory is short) early.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def best_spans(start_logits, end_logits, valid_mask, max_answer_length=30):
+    """
+    Pick the highest scoring answer span in each row.
+
+    A span (s, e) scores start_logits[s] + end_logits[e] and is only allowed
+    when both ends are valid tokens, s <= e and e - s + 1 <= max_answer_length.
+
+    Parameters:
+        start_logits, end_logits (Tensor): [batch, seq_len] logits.
+        valid_mask (Tensor): [batch, seq_len] bool, True where a span may start or end.
+        max_answer_length (int): Longest allowed answer in tokens.
+
+    Returns:
+        tuple: (scores, starts, ends) tensors of shape [batch]; ends are inclusive.
+    """
+    start_logits = start_logits.masked_fill(~valid_mask, float("-inf"))
+    end_logits = end_logits.masked_fill(~valid_mask, float("-inf"))
+    scores = start_logits[:, :, None] + end_logits[:, None, :]
+
+    seq_len = scores.size(-1)
+    allowed = torch.ones(seq_len, seq_len, dtype=torch.bool, device=scores.device)
+    allowed = allowed.triu().tril(max_answer_length - 1)
+    scores = scores.masked_fill(~allowed, float("-inf"))
+
+    best_scores, flat_idx = scores.view(scores.size(0), -1).max(dim=-1)
+    return best_scores, flat_idx // seq_len, flat_idx % seq_len
+
+
+def extract_answer_batch(tokenizer, model, pairs, batch_size=16, max_length=512, max_answer_length=30):
+    """
+    Run extractive QA over many (question, context) pairs.
+
+    Pairs are sorted by length and padded per micro-batch, so each batch is
+    one forward pass with as little padding as possible.
+
+    Returns:
+        list[str]: Answers in the same order as `pairs`.
+    """
+    lengths = [
+        len(ids) for ids in tokenizer(
+            [q for q, _ in pairs], [c for _, c in pairs],
+            truncation=True, max_length=max_length
+        )["input_ids"]
+    ]
+    answers = [None] * len(pairs)
+
+    for batch in length_sorted_batches(lengths, batch_size):
+        inputs = tokenizer(
+            [pairs[i][0] for i in batch], [pairs[i][1] for i in batch],
+            return_tensors="pt", truncation=True, max_length=max_length, padding=True
+        )
+        with torch.no_grad():
+            outputs = model(**inputs)
+
+        # Never pick an answer boundary on padding
+        _, start_idx, end_idx = best_spans(
+            outputs.start_logits, outputs.end_logits,
+            inputs["attention_mask"].bool(), max_answer_length
+        )
+
+        for row, i in enumerate(batch):
+            answer = tokenizer.convert_tokens_to_string(
+                tokenizer.convert_ids_to_tokens(
+                    inputs["input_ids"][row][start_idx[row]:end_idx[row] + 1]
+                )
+            )
+            answers[i] = answer.strip()
+
+    return answers
+
+
+def exceeds_max_length(tokenizer, question, context, max_length=512):
+    """True when (question, context) is longer than `max_length` tokens and would be truncated"""
+    return len(tokenizer(question, context)["input_ids"]) > max_length
+
+
+def extract_answer_windowed(tokenizer, model, question, context, max_length=512,
+                            doc_stride=128, max_answer_length=30, batch_size=None):
+    """
+    Extractive QA over a context of any length using overlapping windows.
+
+    The context is split into `max_length`-token windows that overlap by
+    `doc_stride` tokens, every window is scored in one batched forward pass
+    (or in chunks of `batch_size` windows) and the best valid span across all
+    windows is returned. Only context tokens can be part of an answer.
+
+    Requires a fast tokenizer (for offsets and overflowing windows).
+
+    Returns:
+        str: Answer text sliced from the original context.
+    """
+    if not tokenizer.is_fast:
+        raise ValueError("Windowed QA needs a fast tokenizer")
+
+    encoding = tokenizer(
+        question, context,
+        truncation="only_second", max_length=max_length, stride=doc_stride,
+        return_overflowing_tokens=True, return_offsets_mapping=True,
+        padding=True, return_tensors="pt"
+    )
+    offsets = encoding.pop("offset_mapping")
+    encoding.pop("overflow_to_sample_mapping", None)
+    num_windows = encoding["input_ids"].size(0)
+
+    valid_mask = torch.tensor([
+        [seq_id == 1 for seq_id in encoding.sequence_ids(w)] for w in range(num_windows)
+    ])
+
+    step = batch_size or num_windows
+    start_logits, end_logits = [], []
+    with torch.no_grad():
+        for i in range(0, num_windows, step):
+            outputs = model(**{key: value[i:i + step] for key, value in encoding.items()})
+            start_logits.append(outputs.start_logits)
+            end_logits.append(outputs.end_logits)
+
+    scores, starts, ends = best_spans(
+        torch.cat(start_logits), torch.cat(end_logits), valid_mask, max_answer_length
+    )
+    window = int(torch.argmax(scores))
+    char_start = int(offsets[window][starts[window]][0])
+    char_end = int(offsets[window][ends[window]][1])
+    return context[char_start:char_end].strip()
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _model_size_bytes(obj):
+    """Resident size of a model's parameters and buffers in bytes (0 for tokenizers)"""
+    size = 0
+    if hasattr(obj, "parameters"):
+        for tensor in obj.parameters():
+            size += tensor.numel() * tensor.element_size()
+    if hasattr(obj, "buffers"):
+        for tensor in obj.buffers():
+            size += tensor.numel() * tensor.element_size()
+    return size
+
+
+class ModelRegistry:
+    """
+    Process-wide, thread-safe cache of loaded models.
+
+    Models are loaded lazily on first use and kept resident. When the total
+    resident size exceeds the memory budget, the least recently used models
+    are evicted (the model just requested is never evicted).
+
+    Parameters:
+        max_memory_mb (float or None): Memory budget in MB, None for unlimited.
+    """
+
+    def __init__(self, max_memory_mb=None):
+        self.max_memory_mb = max_memory_mb
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks = {}
+
+    def get(self, key, loader):
+        """
+        Return the object stored under `key`, calling `loader()` to build it on first use.
+
+        Concurrent requests for the same key wait for a single load instead of
+        loading the model twice.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry["hits"] += 1
+                return entry["value"]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entry["hits"] += 1
+                    return entry["value"]
+
+            print(f"Loading {key}...")
+            start = time.perf_counter()
+            value = loader()
+            load_time = time.perf_counter() - start
+
+            size = 0
+            for part in value if isinstance(value, tuple) else (value,):
+                size += _model_size_bytes(part)
+
+            with self._lock:
+                self._entries[key] = {
+                    "value": value,
+                    "load_time_s": load_time,
+                    "size_bytes": size,
+                    "hits": 0,
+                }
+                self._evict(keep=key)
+            print(f"Loaded {key} in {load_time:.2f}s ({size / 2**20:.1f} MB)")
+            return value
+
+    def _evict(self, keep=None):
+        if self.max_memory_mb is None:
+            return
+        budget = self.max_memory_mb * 2**20
+        for key in list(self._entries):
+            if self.resident_bytes() <= budget:
+                break
+            if key == keep:
+                continue
+            print(f"Evicting {key} from model registry")
+            del self._entries[key]
+
+    def resident_bytes(self):
+        """Total size of all resident models in bytes"""
+        with self._lock:
+            return sum(entry["size_bytes"] for entry in self._entries.values())
+
+    def unload(self, key):
+        """Drop a model from the registry if it is resident"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every resident model"""
+        with self._lock:
+            self._entries.clear()
+
+    def set_memory_budget(self, max_memory_mb):
+        """Change the memory budget, evicting models if it is now exceeded"""
+        with self._lock:
+            self.max_memory_mb = max_memory_mb
+            self._evict()
+
+    def stats(self):
+        """
+        Report the resident models, most recently used last.
+
+        Returns:
+            dict: key -> {"load_time_s", "size_mb", "hits"}
+        """
+        with self._lock:
+            return {
+                key: {
+                    "load_time_s": round(entry["load_time_s"], 3),
+                    "size_mb": round(entry["size_bytes"] / 2**20, 1),
+                    "hits": entry["hits"],
+                }
+                for key, entry in self._entries.items()
+            }
+
+
+def _budget_from_env():
+    value = os.environ.get("LAB4_MODEL_MEMORY_MB")
+    return float(value) if value else None
+
+
+# Shared by every QA backend; set LAB4_MODEL_MEMORY_MB to bound resident memory
+registry = ModelRegistry(max_memory_mb=_budget_from_env())
+
+
+def load_pretrained(model_name, model_cls, tokenizer_cls=None):
+    """
+    Return a (tokenizer, model) pair from the shared registry, loading it on first use.
+
+    Parameters:
+        model_name (str): Hugging Face model id.
+        model_cls: Auto model class, e.g. AutoModelForQuestionAnswering.
+        tokenizer_cls: Tokenizer class (defaults to AutoTokenizer).
+
+    Returns:
+        tuple: (tokenizer, model) with the model in eval mode.
+    """
+    def loader():
+        from transformers import AutoTokenizer
+
+        tokenizer = (tokenizer_cls or AutoTokenizer).from_pretrained(model_name)
+        model = model_cls.from_pretrained(model_name)
+        model.eval()
+        return tokenizer, model
+
+    return registry.get(model_name, loader)
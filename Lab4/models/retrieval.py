@@ -0,0 +1,116 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Lowercased word tokens (works for Latin and Devanagari scripts)"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text, passage_words=120, overlap_words=30):
+    """
+    Split a document into overlapping passages of roughly `passage_words` words.
+
+    Returns:
+        list[str]: Passages in document order.
+    """
+    words = text.split()
+    if not words:
+        return []
+
+    step = max(1, passage_words - overlap_words)
+    passages = []
+    for start in range(0, len(words), step):
+        passages.append(" ".join(words[start:start + passage_words]))
+        if start + passage_words >= len(words):
+            break
+    return passages
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 index over the passages of one document.
+
+    Parameters:
+        passages (list[str]): Passages to index.
+        k1 (float): Term frequency saturation.
+        b (float): Length normalisation.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+
+        self._postings = {}
+        self._lengths = []
+        for i, passage in enumerate(passages):
+            counts = Counter(tokenize(passage))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((i, tf))
+
+        n = len(passages)
+        self._avg_length = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def search(self, query, k=3):
+        """
+        Return the top-k passages for `query`.
+
+        Returns:
+            list[tuple[int, float]]: (passage index, score), best first.
+        """
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+_MAX_CACHED_INDEXES = 16
+
+
+def get_index(text, passage_words=120, overlap_words=30):
+    """Return the BM25 index for a document, building it once and reusing it across questions"""
+    key = (hashlib.sha1(text.encode("utf-8")).hexdigest(), passage_words, overlap_words)
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+
+    index = BM25Index(chunk_text(text, passage_words, overlap_words))
+
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > _MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def retrieve(question, text, top_k=3):
+    """
+    Return the passages of `text` most relevant to `question`, in document order.
+
+    Falls back to the opening passages when no query term matches.
+    """
+    index = get_index(text)
+    hits = index.search(question, k=top_k)
+    if not hits:
+        return index.passages[:top_k]
+    return [index.passages[i] for i in sorted(i for i, _ in hits)]
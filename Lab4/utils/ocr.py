@@ -0,0 +1,183 @@
+import functools
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+# Tesseract language codes tried on every OCR'd page
+DEFAULT_OCR_LANGUAGES = os.environ.get("LAB4_OCR_LANGUAGES", "eng+hin+fra")
+
+def _tesseract_page(path, page_num, language):
+    """OCR one page with the Tesseract engine built into PyMuPDF"""
+    with fitz.open(path) as doc:
+        page = doc.load_page(page_num)
+        textpage = page.get_textpage_ocr(language=language, dpi=300, full=True)
+        return page.get_text(textpage=textpage)
+
+@functools.lru_cache(maxsize=None)
+def _tessdata_dir():
+    try:
+        return fitz.get_tessdata()
+    except Exception:
+        return os.environ.get("TESSDATA_PREFIX")
+
+def _tesseract_available():
+    return bool(_tessdata_dir())
+
+@functools.lru_cache(maxsize=None)
+def installed_tesseract_languages():
+    """Language codes with a *.traineddata file in the tessdata directory (None if unknown)"""
+    tessdata = _tessdata_dir()
+    if not tessdata or not os.path.isdir(tessdata):
+        return None
+    return frozenset(
+        os.path.splitext(os.path.basename(name))[0]
+        for name in glob.glob(os.path.join(tessdata, "*.traineddata"))
+    )
+
+def tesseract_languages(language):
+    """
+    The requested "+"-joined language codes that are actually installed.
+
+    Tesseract fails the whole page if any requested language is missing, so
+    e.g. "eng+hin+fra" becomes "eng+fra" on a machine without Hindi data.
+    Returns "" when none of them are installed.
+    """
+    installed = installed_tesseract_languages()
+    if installed is None:
+        return language
+    return "+".join(code for code in language.split("+") if code in installed)
+
+# name -> (ocr_page(path, page_num, language) -> str, is_available() -> bool)
+OCR_ENGINES = {
+    "tesseract": (_tesseract_page, _tesseract_available),
+}
+
+def register_ocr_engine(name, ocr_page, is_available=lambda: True):
+    """
+    Add an OCR engine.
+
+    `ocr_page(path, page_num, language)` must be a module-level function so it
+    can run in a worker process, and must return the page text.
+    """
+    OCR_ENGINES[name] = (ocr_page, is_available)
+
+@functools.lru_cache(maxsize=None)
+def _engine_available(engine, is_available):
+    return bool(is_available())
+
+def ocr_available(engine="tesseract"):
+    """True if the engine is registered and usable offline on this machine (checked once)"""
+    return engine in OCR_ENGINES and _engine_available(engine, OCR_ENGINES[engine][1])
+
+def ocr_usable(engine="tesseract", language=DEFAULT_OCR_LANGUAGES):
+    """True if `engine` is available and, for Tesseract, one of the requested languages is installed"""
+    if not ocr_available(engine):
+        return False
+    return engine != "tesseract" or bool(tesseract_languages(language))
+
+# Text-less pages with a content stream at least this large are drawn, not blank
+# (e.g. text converted to vector outlines)
+MIN_DRAWN_CONTENT_BYTES = 1024
+
+def page_hash(doc, page, contents=None):
+    """Fingerprint of a page's content stream and embedded images (no rendering)"""
+    digest = hashlib.sha256(page.read_contents() if contents is None else contents)
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+def find_ocr_candidates(path, page_texts):
+    """
+    Cheaply find the pages that need OCR: no text layer, but images or
+    non-trivial vector content. Nothing is rendered here.
+
+    Returns:
+        dict: page_num -> page hash.
+    """
+    blank = [i for i, text in enumerate(page_texts) if not text.strip()]
+    if not blank:
+        return {}
+
+    candidates = {}
+    with fitz.open(path) as doc:
+        for page_num in blank:
+            page = doc.load_page(page_num)
+            contents = page.read_contents()
+            if page.get_images() or len(contents) >= MIN_DRAWN_CONTENT_BYTES:
+                candidates[page_num] = page_hash(doc, page, contents)
+    return candidates
+
+def _run_ocr(args):
+    """Worker: OCR one page; a failure yields None so only that page falls back"""
+    ocr_page, path, page_num, language = args
+    try:
+        return ocr_page(path, page_num, language)
+    except Exception as e:
+        print(f"OCR failed on page {page_num + 1} of {path}: {e}")
+        return None
+
+def ocr_missing_pages(path, page_texts, cache, language=DEFAULT_OCR_LANGUAGES,
+                      engine="tesseract", workers=None):
+    """
+    Fill image-only pages with OCR text.
+
+    Only pages without a text layer are OCR'd, each distinct page at most
+    once: results are cached by page hash, so a page is never OCR'd again even
+    if it appears in another file. Uncached pages run in a process pool.
+    Pages whose OCR fails come back as None and are not cached.
+
+    Parameters:
+        path (str): PDF file.
+        page_texts (list[str]): Text layer of each page.
+        cache (PDFTextCache or None): Cache holding OCR results (None: no caching).
+        language (str): Tesseract language codes, e.g. "eng+hin+fra".
+        engine (str): Registered OCR engine name.
+        workers (int or None): Worker processes (default: one per CPU).
+
+    Returns:
+        list[str]: `page_texts` with OCR text for image-only pages (None for
+        pages whose OCR failed).
+    """
+    if engine == "tesseract":
+        language = tesseract_languages(language)
+        if not language:
+            print("No requested OCR language is installed; skipping OCR")
+            return page_texts
+
+    candidates = find_ocr_candidates(path, page_texts)
+    if not candidates:
+        return page_texts
+
+    cache_key = f"{engine}:{language}"
+    results = cache.get_ocr(candidates.values(), cache_key) if cache is not None else {}
+
+    # One representative page per distinct hash still to OCR
+    todo = {}
+    for page_num, digest in candidates.items():
+        if digest not in results and digest not in todo:
+            todo[digest] = page_num
+
+    if todo:
+        print(f"Running OCR on {len(todo)} page(s) of {path}...")
+        # The engine function itself (pickled by reference) goes to the workers,
+        # so engines registered at runtime work under the spawn start method too
+        ocr_page = OCR_ENGINES[engine][0]
+        jobs = [(ocr_page, path, page_num, language) for page_num in todo.values()]
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        if workers <= 1:
+            texts = [_run_ocr(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                texts = list(pool.map(_run_ocr, jobs))
+        new_results = {digest: text for digest, text in zip(todo, texts) if text is not None}
+        if cache is not None:
+            cache.put_ocr(new_results, cache_key)
+        results.update(new_results)
+
+    page_texts = list(page_texts)
+    for page_num, digest in candidates.items():
+        page_texts[page_num] = results.get(digest)
+    return page_texts
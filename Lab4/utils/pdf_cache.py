@@ -0,0 +1,195 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lab4")
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Content hash of a file, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PDFTextCache:
+    """
+    Content-addressed SQLite cache of per-page PDF text.
+
+    Entries are keyed by (file hash, extractor version), so editing a PDF or
+    changing the extraction code never serves stale text. When a path is seen
+    with new content, the entries for its previous content are dropped.
+
+    Parameters:
+        db_path (str): SQLite database file (created if missing).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    file_hash TEXT NOT NULL,
+                    extractor_version TEXT NOT NULL,
+                    page_num INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (file_hash, extractor_version, page_num)
+                );
+                CREATE TABLE IF NOT EXISTS documents (
+                    file_hash TEXT NOT NULL,
+                    extractor_version TEXT NOT NULL,
+                    page_count INTEGER NOT NULL,
+                    PRIMARY KEY (file_hash, extractor_version)
+                );
+                CREATE TABLE IF NOT EXISTS paths (
+                    path TEXT PRIMARY KEY,
+                    file_hash TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS ocr_pages (
+                    page_hash TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (page_hash, language)
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, path, file_hash, extractor_version, count=True):
+        """
+        Return the cached page texts for a file, or None on a miss.
+
+        With `count=False` the lookup is left out of the hit/miss stats; the
+        caller reports the outcome with `count_lookup` (e.g. once for several
+        versions tried for the same file).
+
+        Returns:
+            list[str] or None: Text of each page in page order.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT page_count FROM documents WHERE file_hash = ? AND extractor_version = ?",
+                (file_hash, extractor_version),
+            ).fetchone()
+            pages = None
+            if row is not None:
+                pages = [text for (text,) in conn.execute(
+                    "SELECT text FROM pages WHERE file_hash = ? AND extractor_version = ? "
+                    "ORDER BY page_num",
+                    (file_hash, extractor_version),
+                )]
+                if len(pages) != row[0]:
+                    pages = None
+
+        if count:
+            self.count_lookup(pages is not None)
+        if pages is not None:
+            self._remember_path(path, file_hash)
+        return pages
+
+    def count_lookup(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, path, file_hash, extractor_version, pages):
+        """Store the page texts for a file"""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM pages WHERE file_hash = ? AND extractor_version = ?",
+                (file_hash, extractor_version),
+            )
+            conn.executemany(
+                "INSERT INTO pages (file_hash, extractor_version, page_num, text) VALUES (?, ?, ?, ?)",
+                [(file_hash, extractor_version, i, text) for i, text in enumerate(pages)],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (file_hash, extractor_version, page_count) VALUES (?, ?, ?)",
+                (file_hash, extractor_version, len(pages)),
+            )
+        self._remember_path(path, file_hash)
+
+    def _remember_path(self, path, file_hash):
+        """Record the current content of `path` and drop its stale entries"""
+        path = os.path.abspath(path)
+        with self._connect() as conn:
+            row = conn.execute("SELECT file_hash FROM paths WHERE path = ?", (path,)).fetchone()
+            if row is not None and row[0] == file_hash:
+                return
+            conn.execute("INSERT OR REPLACE INTO paths (path, file_hash) VALUES (?, ?)", (path, file_hash))
+            if row is None:
+                return
+
+            old_hash = row[0]
+            still_used = conn.execute("SELECT 1 FROM paths WHERE file_hash = ?", (old_hash,)).fetchone()
+            if still_used is None:
+                conn.execute("DELETE FROM pages WHERE file_hash = ?", (old_hash,))
+                conn.execute("DELETE FROM documents WHERE file_hash = ?", (old_hash,))
+
+    def get_ocr(self, page_hashes, language):
+        """
+        Look up OCR text for pages by page hash.
+
+        Returns:
+            dict: page_hash -> text for the pages that were already OCR'd.
+        """
+        found = {}
+        with self._connect() as conn:
+            for page_hash in set(page_hashes):
+                row = conn.execute(
+                    "SELECT text FROM ocr_pages WHERE page_hash = ? AND language = ?",
+                    (page_hash, language),
+                ).fetchone()
+                if row is not None:
+                    found[page_hash] = row[0]
+        return found
+
+    def put_ocr(self, results, language):
+        """Store OCR text for pages, given a page_hash -> text mapping"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ocr_pages (page_hash, language, text) VALUES (?, ?, ?)",
+                [(page_hash, language, text) for page_hash, text in results.items()],
+            )
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache():
+    """Process-wide cache in $LAB4_CACHE_DIR (default ~/.cache/lab4)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            cache_dir = os.environ.get("LAB4_CACHE_DIR", DEFAULT_CACHE_DIR)
+            _cache = PDFTextCache(os.path.join(cache_dir, "pdf_text.sqlite3"))
+        return _cache
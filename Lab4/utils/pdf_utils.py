@@ -1,25 +1,118 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import fitz  # PyMuPDF
 
-def extract_text_from_pdf(path):
-    """Extract text from PDF file using PyMuPDF with OCR fallback"""
-    try:
-        doc = fitz.open(path)
-        text = ""
+from utils.ocr import ocr_missing_pages, ocr_usable
+from utils.pdf_cache import file_sha256, get_pdf_cache
+
+# Bump whenever the page extraction logic changes so cached text is invalidated
+EXTRACTOR_VERSION = "1"
+
+# Documents shorter than this are read serially; worker start-up would dominate
+PARALLEL_MIN_PAGES = 32
 
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
+def iter_pdf_pages(path, start=0, stop=None):
+    """
+    Lazily yield (page_num, text) for the pages of a PDF.
 
-            # First try regular text extraction
-            page_text = page.get_text()
+    Parameters:
+        path (str): PDF file.
+        start (int): First page (0-based).
+        stop (int or None): Page to stop before (default: end of document).
+    """
+    doc = fitz.open(path)
+    try:
+        stop = len(doc) if stop is None else min(stop, len(doc))
+        for page_num in range(start, stop):
+            yield page_num, doc.load_page(page_num).get_text()
+    finally:
+        doc.close()
 
-            # If no text found, try OCR or provide sample content
+def _read_page_range(args):
+    """Worker: open a private document handle and read one shard of pages"""
+    path, start, stop = args
+    return [text for _, text in iter_pdf_pages(path, start, stop)]
+
+def _read_pages(path, workers=None):
+    """
+    Raw text of every page, in page order.
+
+    Large documents are split into contiguous page ranges that are read in
+    parallel by `workers` processes (default: one per CPU).
+    """
+    workers = workers or os.cpu_count() or 1
+    with fitz.open(path) as doc:
+        page_count = len(doc)
+
+    if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+        return [text for _, text in iter_pdf_pages(path)]
+
+    workers = min(workers, page_count)
+    shard = -(-page_count // workers)
+    ranges = [(path, start, start + shard) for start in range(0, page_count, shard)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [text for texts in pool.map(_read_page_range, ranges) for text in texts]
+
+def extract_pages(path, use_cache=True, workers=None, ocr=True):
+    """
+    Per-page text of a PDF, served from the on-disk cache when the file is unchanged.
+
+    Parameters:
+        path (str): PDF file.
+        use_cache (bool): Read and populate the on-disk text cache.
+        workers (int or None): Processes for parallel extraction and OCR (1 = serial).
+        ocr (bool): OCR image-only pages when an offline OCR engine is installed.
+
+    Returns:
+        list[str]: Text of each page (empty for pages with no recoverable text).
+    """
+    cache = get_pdf_cache() if use_cache else None
+    # OCR'd text differs from the bare text layer, so it is cached separately
+    version = f"{EXTRACTOR_VERSION}+ocr" if ocr else EXTRACTOR_VERSION
+
+    file_hash = None
+    if use_cache:
+        file_hash = file_sha256(path)
+        pages = cache.get(path, file_hash, version, count=False)
+        if pages is None and ocr and not ocr_usable():
+            # Only checked on a miss (and memoized), so cached files never probe for Tesseract
+            ocr = False
+            version = EXTRACTOR_VERSION
+            pages = cache.get(path, file_hash, version, count=False)
+        # One lookup per file in the stats, however many versions were tried
+        cache.count_lookup(pages is not None)
+        if pages is not None:
+            return pages
+    elif ocr:
+        ocr = ocr_usable()
+
+    pages = _read_pages(path, workers)
+    complete = True
+    if ocr:
+        pages = ocr_missing_pages(path, pages, cache, workers=workers)
+        # Pages whose OCR failed come back as None; retry them next time
+        complete = None not in pages
+        pages = [text or "" for text in pages]
+
+    if use_cache and complete:
+        cache.put(path, file_hash, version, pages)
+    return pages
+
+def extract_text_from_pdf(path, use_cache=True, workers=None, ocr=True):
+    """Extract text from PDF file using PyMuPDF with OCR fallback"""
+    try:
+        page_texts = []
+        for page_num, page_text in enumerate(extract_pages(path, use_cache, workers, ocr)):
+            # Image-only pages are OCR'd when an OCR engine is installed
             if not page_text.strip():
-                # For image-based PDFs, provide sample content
+                # Otherwise (or if OCR found nothing) mark the page as graphics
                 page_text = f"[Page {page_num + 1} contains images/graphics about solar system]"
 
-            text += page_text + "\n"
+            page_texts.append(page_text)
 
-        doc.close()
+        # Join once instead of growing a string page by page
+        text = "\n".join(page_texts) + "\n" if page_texts else ""
 
         # If still no meaningful text, provide sample content
         if len(text.strip()) < 200:  # Increased threshold to trigger sample content
@@ -1,7 +1,63 @@
+import threading
+
+import torch
 import whisper
 
-def transcribe_audio(audio_path):
+WHISPER_SIZES = ("tiny", "base", "small")
+
+_models = {}
+_models_lock = threading.Lock()
+
+def load_whisper_model(size="base"):
+    """Return the Whisper model of the given size, loading it once per process"""
+    if size not in WHISPER_SIZES:
+        raise ValueError(f"Unsupported Whisper model size '{size}', expected one of {WHISPER_SIZES}")
+
+    with _models_lock:
+        if size not in _models:
+            print(f"Loading Whisper {size} model...")
+            _models[size] = whisper.load_model(size)
+        return _models[size]
+
+def _set_threads(threads):
+    if threads:
+        torch.set_num_threads(threads)
+
+def transcribe_audio(audio_path, model_size="base", threads=None):
     """Transcribe audio file using Whisper"""
-    model = whisper.load_model("base")
-    result = model.transcribe(audio_path)
+    _set_threads(threads)
+    model = load_whisper_model(model_size)
+    result = model.transcribe(audio_path, fp16=torch.cuda.is_available())
     return result['text']
+
+def transcribe_stream(audio_path, model_size="base", window_seconds=30, threads=None):
+    """
+    Transcribe audio in fixed windows, yielding text as each window finishes.
+
+    Parameters:
+        audio_path (str): Audio file readable by ffmpeg.
+        model_size (str): 'tiny', 'base' or 'small'.
+        window_seconds (int): Window length; 30 s matches Whisper's input size.
+        threads (int or None): CPU threads for inference (default: torch's).
+
+    Yields:
+        str: Transcribed text of each window, in order.
+    """
+    _set_threads(threads)
+    model = load_whisper_model(model_size)
+    audio = whisper.load_audio(audio_path)
+    window = int(window_seconds * whisper.audio.SAMPLE_RATE)
+
+    previous_text = ""
+    for start in range(0, len(audio), window):
+        chunk = audio[start:start + window]
+        result = model.transcribe(
+            chunk,
+            fp16=torch.cuda.is_available(),
+            # Condition on the previous window so words split at a boundary stay consistent
+            initial_prompt=previous_text or None,
+        )
+        text = result['text'].strip()
+        if text:
+            previous_text = text
+            yield text
@@ -1,11 +1,160 @@
-from gtts import gTTS
+import hashlib
+import io
 import os
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lab4", "tts")
+
+
+class GTTSEngine:
+    """Google Translate TTS (needs internet access), returns MP3 bytes"""
+
+    name = "gtts"
+    mime = "audio/mp3"
+    extension = ".mp3"
+
+    def is_available(self):
+        try:
+            import gtts  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def synthesize(self, text, lang, voice=None):
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class EspeakEngine:
+    """Offline eSpeak NG synthesizer, returns WAV bytes straight from stdout"""
+
+    name = "espeak"
+    mime = "audio/wav"
+    extension = ".wav"
+
+    def __init__(self):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def is_available(self):
+        return self.binary is not None
+
+    def synthesize(self, text, lang, voice=None):
+        # Text goes in on stdin, so text starting with "-" is never read as an option
+        result = subprocess.run(
+            [self.binary, "--stdout", "--stdin", "-v", voice or lang],
+            input=text.encode("utf-8"), capture_output=True, check=True
+        )
+        return result.stdout
+
+
+ENGINES = {
+    "espeak": EspeakEngine,
+    "gtts": GTTSEngine,
+}
+
+
+class TTSService:
+    """
+    Text-to-speech with an in-memory LRU cache and an on-disk cache.
+
+    Audio is keyed by (engine, text, lang, voice), so a repeated answer is
+    served without re-synthesizing it, across app sessions and restarts.
+
+    Parameters:
+        engine (str): 'espeak' (offline), 'gtts' or 'auto' (offline if installed).
+        cache_dir (str or None): Directory for cached audio, None to disable.
+        max_memory_items (int): Number of clips kept in memory.
+    """
+
+    def __init__(self, engine="auto", cache_dir=DEFAULT_CACHE_DIR, max_memory_items=128):
+        if engine == "auto":
+            engine = "espeak" if EspeakEngine().is_available() else "gtts"
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown TTS engine '{engine}', expected one of {list(ENGINES)}")
+
+        self.engine = ENGINES[engine]()
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def mime(self):
+        return self.engine.mime
+
+    @property
+    def extension(self):
+        return self.engine.extension
+
+    def _key(self, text, lang, voice):
+        raw = "\0".join([self.engine.name, lang, voice or "", text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def synthesize(self, text, lang="en", voice=None):
+        """
+        Return the audio for `text` as bytes (format given by `self.mime`).
+        """
+        key = self._key(text, lang, voice)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                return audio
+
+        disk_path = os.path.join(self.cache_dir, key + self.extension) if self.cache_dir else None
+        if disk_path and os.path.exists(disk_path):
+            with open(disk_path, "rb") as f:
+                audio = f.read()
+        else:
+            audio = self.engine.synthesize(text, lang, voice)
+            if disk_path:
+                # Write then rename so a concurrent reader never sees a partial file
+                tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp_path, disk_path)
+
+        with self._lock:
+            self._memory[key] = audio
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+        return audio
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_tts_service():
+    """Process-wide TTS service; engine from $LAB4_TTS_ENGINE (default 'auto')"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TTSService(engine=os.environ.get("LAB4_TTS_ENGINE", "auto"))
+        return _service
+
 
 def speak(text, lang='en', filename='output.mp3'):
-    """Convert text to speech and save as file (for Streamlit compatibility)"""
+    """
+    Convert text to speech and save as file (for Streamlit compatibility)
+
+    The extension of `filename` is adjusted to the engine's audio format;
+    the path actually written is returned.
+    """
     try:
-        tts = gTTS(text=text, lang=lang)
-        tts.save(filename)
+        service = get_tts_service()
+        audio = service.synthesize(text, lang)
+        filename = os.path.splitext(filename)[0] + service.extension
+        with open(filename, "wb") as f:
+            f.write(audio)
         return filename
     except Exception as e:
         print(f"Error in text-to-speech: {e}")
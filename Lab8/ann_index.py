@@ -0,0 +1,241 @@
+"""
+Approximate nearest neighbour index modes for the Lab8 vector store.
+
+    flat      exact search, float32 vectors (the default)
+    ivf_flat  inverted lists over k-means cells; searches `nprobe` cells
+    hnsw      graph index; `ef_search` trades latency for recall
+    ivf_pq    inverted lists with product-quantized codes (~16-32x smaller)
+
+IVF indexes are trained on a random sample of the vectors. Compare the
+modes on your own data with:
+
+    python ann_index.py --kb-dir ~/.cache/lab8/knowledge_base --queries 200
+    python ann_index.py --synthetic 200000 --dim 768
+"""
+import argparse
+import math
+import statistics
+import time
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# k-means wants at least this many training points per centroid
+TRAIN_POINTS_PER_CENTROID = 39
+
+
+def default_nlist(n):
+    """Number of IVF cells: about 4 * sqrt(n), at least 1"""
+    return max(1, int(4 * math.sqrt(n)))
+
+
+def default_pq_m(dim):
+    """Sub-quantizers for IVF-PQ: the largest of 64/48/32/16/8 dividing dim, 8 bits each"""
+    for m in (64, 48, 32, 16, 8):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def min_vectors(index_type):
+    """Fewest vectors worth training an index of this type on (0 = no training)"""
+    if index_type in ("flat", "hnsw"):
+        return 0
+    if index_type == "ivf_pq":
+        # The PQ codebooks have 256 centroids per sub-quantizer
+        return TRAIN_POINTS_PER_CENTROID * 256
+    return TRAIN_POINTS_PER_CENTROID * 64
+
+
+def build_index(vectors, index_type="flat", nlist=None, hnsw_m=32, pq_m=None, sample_size=100_000, seed=0):
+    """
+    Build a FAISS index (L2 metric, like LangChain's FAISS store) over `vectors`.
+
+    Args:
+        vectors (np.ndarray): float32 array of shape (n, dim)
+        index_type (str): One of INDEX_TYPES
+        nlist (int or None): IVF cells (default: default_nlist(n), capped so
+            every cell gets enough training points)
+        hnsw_m (int): HNSW neighbours per node
+        pq_m (int or None): IVF-PQ sub-quantizers (default: default_pq_m(dim))
+        sample_size (int): Vectors used to train IVF indexes
+        seed (int): Sampling seed
+
+    Returns:
+        faiss.Index: The index, with all vectors added in order
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+    else:
+        nlist = nlist or default_nlist(n)
+        nlist = max(1, min(nlist, n // TRAIN_POINTS_PER_CENTROID))
+        if index_type == "ivf_flat":
+            index = faiss.index_factory(dim, f"IVF{nlist},Flat", faiss.METRIC_L2)
+        else:
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{pq_m or default_pq_m(dim)}x8", faiss.METRIC_L2)
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, sample_size), replace=False)] if n > sample_size else vectors
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def index_type_of(index):
+    """The INDEX_TYPES name of a built index"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return "flat"
+    return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Tune search effort: IVF cells probed, or HNSW candidate list size"""
+    if isinstance(index, faiss.IndexHNSW):
+        if ef_search:
+            index.hnsw.efSearch = ef_search
+        return
+    if nprobe:
+        try:
+            ivf = faiss.extract_index_ivf(index)
+        except RuntimeError:
+            return
+        ivf.nprobe = min(nprobe, ivf.nlist)
+
+
+def reconstruct_all(index):
+    """
+    All vectors of an index, in insertion order.
+
+    Exact for flat, IVF-Flat and HNSW; IVF-PQ only stores compressed codes,
+    so its vectors come back approximated.
+    """
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _search_latency(index, queries, k):
+    """Search one query at a time (as the chatbot does); returns (ids, per-query seconds)"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        ids.append(found[0])
+    return np.array(ids), latencies
+
+
+def recall_report(vectors, queries, configs, k=10):
+    """
+    Recall@k and latency of ANN configurations against exact search.
+
+    Args:
+        vectors (np.ndarray): Corpus vectors, float32 (n, dim)
+        queries (np.ndarray): Query vectors, float32 (q, dim)
+        configs (list of dict): build_index / set_search_params arguments,
+            e.g. {'index_type': 'ivf_flat', 'nprobe': 8}
+        k (int): Neighbours compared
+
+    Returns:
+        list of dict: One row per config plus the exact baseline, with
+        recall, median / p95 query latency in ms, index size in MB and
+        build time in seconds
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    rows = []
+    exact_ids = None
+    for config in [{"index_type": "flat"}] + list(configs):
+        config = dict(config)
+        search_params = {key: config.pop(key) for key in ("nprobe", "ef_search") if key in config}
+
+        start = time.perf_counter()
+        index = build_index(vectors, **config)
+        build_seconds = time.perf_counter() - start
+        set_search_params(index, **search_params)
+
+        found, latencies = _search_latency(index, queries, k)
+        if exact_ids is None:
+            exact_ids = found
+        recall = float(np.mean([
+            len(set(row[row >= 0]) & set(exact[exact >= 0])) / max(1, len(exact[exact >= 0]))
+            for row, exact in zip(found, exact_ids)
+        ]))
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        rows.append({
+            **config,
+            **search_params,
+            f"recall@{k}": round(recall, 4),
+            "latency_p50_ms": round(statistics.median(latencies_ms), 3),
+            "latency_p95_ms": round(latencies_ms[min(len(latencies_ms) - 1, int(0.95 * len(latencies_ms)))], 3),
+            "index_mb": round(faiss.serialize_index(index).nbytes / 1024 ** 2, 2),
+            "build_s": round(build_seconds, 2),
+        })
+    return rows
+
+
+DEFAULT_CONFIGS = [
+    {"index_type": "ivf_flat", "nprobe": 4},
+    {"index_type": "ivf_flat", "nprobe": 16},
+    {"index_type": "ivf_flat", "nprobe": 64},
+    {"index_type": "hnsw", "ef_search": 16},
+    {"index_type": "hnsw", "ef_search": 64},
+    {"index_type": "hnsw", "ef_search": 256},
+    {"index_type": "ivf_pq", "nprobe": 16},
+    {"index_type": "ivf_pq", "nprobe": 64},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of ANN index modes against exact search")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--kb-dir", help="Use the vectors of a saved knowledge base")
+    source.add_argument("--synthetic", type=int, help="Use this many random vectors")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Corpus vectors held out as queries")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.kb_dir:
+        from ingestion import KnowledgeBase
+
+        knowledge_base = KnowledgeBase(args.kb_dir, read_only=True)
+        if knowledge_base.store is None:
+            raise SystemExit(f"{args.kb_dir} is empty")
+        vectors = reconstruct_all(knowledge_base.store.index)
+    else:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((args.synthetic, args.dim)).astype(np.float32)
+
+    # Held-out corpus vectors (plus a little noise) stand in for queries
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.01 * rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+
+    configs = [
+        config for config in DEFAULT_CONFIGS
+        if len(vectors) >= min_vectors(config["index_type"])
+    ]
+    for row in recall_report(vectors, queries, configs, k=args.k):
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,10 @@
 import streamlit as st
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.chains import RetrievalQA
 from langchain_groq import ChatGroq
 from deep_translator import GoogleTranslator
 from langdetect import detect
-from langchain.schema import Document
+from ingestion import KnowledgeBase
+from ann_index import INDEX_TYPES
 
 # --- Helper: Split translation into safe chunks (only for LLM response) ---
 def translate_large_text(text, source_lang, target_lang, chunk_size=4000):
@@ -15,27 +13,66 @@ def translate_large_text(text, source_lang, target_lang, chunk_size=4000):
     translated_chunks = [translator.translate(chunk) for chunk in chunks]
     return " ".join(translated_chunks)
 
+# --- Knowledge base: persistent, grows one document at a time ---
+@st.cache_resource
+def load_knowledge_base():
+    return KnowledgeBase()
+
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="Domain Chatbot (Lab 8)", layout="centered")
 st.title("💬 Domain-Specific Chatbot with LangChain + Groq")
 
 # --- 1. LOAD DOMAIN KNOWLEDGE ---
 st.sidebar.header("1. Upload Domain Data")
-uploaded_file = st.sidebar.file_uploader("Upload a TXT file", type=["txt"])
+knowledge_base = load_knowledge_base()
+uploaded_files = st.sidebar.file_uploader("Upload TXT files", type=["txt", "md"], accept_multiple_files=True)
+
+# Each upload is ingested once; later reruns (e.g. after removing it below)
+# must not add it back. Only new or changed chunks are embedded.
+if "ingested_uploads" not in st.session_state:
+    st.session_state.ingested_uploads = set()
+for uploaded_file in uploaded_files or []:
+    if uploaded_file.file_id in st.session_state.ingested_uploads:
+        continue
+    result = knowledge_base.add_text(f"upload:{uploaded_file.name}", uploaded_file.getvalue().decode("utf-8"))
+    st.session_state.ingested_uploads.add(uploaded_file.file_id)
+    if result["added"]:
+        st.sidebar.caption(f"{uploaded_file.name}: {result['added']} new chunks, {result['reused']} reused")
+
+folder = st.sidebar.text_input("Or ingest a local folder")
+if folder and st.sidebar.button("Ingest folder"):
+    with st.spinner("Ingesting..."):
+        results = knowledge_base.add_path(folder, prune=True)
+    st.sidebar.success(f"{len(results)} files, {sum(r['added'] for r in results.values())} new chunks")
+
+sources = knowledge_base.list_sources()
+if sources:
+    with st.sidebar.expander(f"Documents ({len(sources)})"):
+        for source in sources:
+            if st.button(f"Remove {source}", key=f"remove-{source}"):
+                knowledge_base.remove(source)
+                st.rerun()
+        st.caption(str(knowledge_base.stats()))
+        st.caption(f"Embeddings: {knowledge_base.embeddings.stats()}")
+
+with st.sidebar.expander("Index settings"):
+    index_type = st.selectbox(
+        "Index type", INDEX_TYPES, index=INDEX_TYPES.index(knowledge_base.index_type),
+        help="flat is exact; IVF/HNSW/PQ keep search fast and small on large corpora "
+             "(compare them with `python ann_index.py`)"
+    )
+    nprobe = st.number_input("IVF nprobe", min_value=1, max_value=1024, value=knowledge_base.nprobe)
+    ef_search = st.number_input("HNSW efSearch", min_value=1, max_value=2048, value=knowledge_base.ef_search)
+    if (index_type, nprobe, ef_search) != (knowledge_base.index_type, knowledge_base.nprobe, knowledge_base.ef_search):
+        with st.spinner("Rebuilding index..."):
+            knowledge_base.set_index_type(index_type, nprobe=nprobe, ef_search=ef_search)
 
-if uploaded_file:
-    # Read uploaded text file
-    file_content = uploaded_file.read().decode("utf-8")
-    documents = [Document(page_content=file_content)]
-    
-    # Split text into chunks
-    splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    docs = splitter.split_documents(documents)
-    
-    # Create vector store using FAISS
-    embeddings = HuggingFaceEmbeddings()
-    vectorstore = FAISS.from_documents(docs, embeddings)
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k":3})
+if sources:
+    hybrid = st.sidebar.checkbox(
+        "Hybrid search (BM25 + dense)", value=True,
+        help="Also match exact terms such as identifiers and part numbers"
+    )
+    retriever = knowledge_base.as_retriever(k=3, hybrid=hybrid)
 
     # --- 2. SETUP LLM (Groq) ---
     st.sidebar.header("2. LLM API Key")
@@ -71,4 +108,4 @@ if uploaded_file:
     else:
         st.warning("Please enter your Groq API key to continue.")
 else:
-    st.info("Please upload a domain-specific TXT file to get started.")
+    st.info("Please upload domain-specific TXT files to get started.")
@@ -0,0 +1,98 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+
+# Runs of letters/digits joined by - _ . / : # stay one token, so part
+# numbers like "AX-200/B" or identifiers like "max_retry.count" survive
+_TOKEN_RE = re.compile(r"\w+(?:[-_./:#]\w+)*", re.UNICODE)
+_PART_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Lowercased tokens for BM25.
+
+    A compound token is kept whole and its alphanumeric parts are added
+    too, so "AX-200/B" matches both the exact part number and "ax 200".
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    Incremental Okapi BM25 inverted index.
+
+    Documents can be added and removed at any time; IDF and the average
+    length are derived from the live counts at query time.
+
+    Args:
+        k1 (float): Term frequency saturation
+        b (float): Length normalisation
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> {doc_id: tf}
+        self._terms = {}  # doc_id -> Counter of its terms
+        self._lengths = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._terms)
+
+    def add(self, doc_id, text):
+        counts = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self._terms:
+                return
+            self._terms[doc_id] = counts
+            self._lengths[doc_id] = sum(counts.values())
+            self._total_length += self._lengths[doc_id]
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id):
+        with self._lock:
+            counts = self._terms.pop(doc_id, None)
+            if counts is None:
+                return
+            self._total_length -= self._lengths.pop(doc_id)
+            for term in counts:
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query, k=10):
+        """
+        Return the top-k documents for `query`.
+
+        Returns:
+            list[tuple[str, float]]: (doc_id, score), best first.
+        """
+        with self._lock:
+            n = len(self._terms)
+            if not n:
+                return []
+            avg_length = self._total_length / n
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
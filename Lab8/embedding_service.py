@@ -0,0 +1,260 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from langchain_core.embeddings import Embeddings
+
+# HuggingFaceEmbeddings' default model, so knowledge bases built before EmbeddingService stay valid
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+DEFAULT_CACHE_DIR = os.environ.get(
+    "LAB8_EMBEDDING_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "lab8", "embeddings")
+)
+
+# SQLite's default limit on host parameters is 999
+_LOOKUP_BATCH = 500
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent chunk-embedding cache keyed by (model, chunk hash).
+
+    Vectors live in one float16 memory-mapped file per model (half the size
+    of float32, and only the pages that are read get loaded); SQLite maps
+    each chunk hash to its row. Rows are allocated inside a write
+    transaction, so several processes can share the cache.
+
+    Args:
+        cache_dir (str): Directory for the database and vector files
+        model_key (str): Identifies the model and its settings
+        dim (int): Embedding dimension
+    """
+
+    def __init__(self, cache_dir, model_key, dim):
+        self.model_key = model_key
+        self.dim = dim
+        self.db_path = os.path.join(cache_dir, "embeddings.sqlite3")
+        self.vectors_path = os.path.join(cache_dir, re.sub(r"[^\w.-]+", "--", model_key) + ".f16")
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS models (
+                    model TEXT PRIMARY KEY,
+                    dim INTEGER NOT NULL,
+                    row_count INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS vectors (
+                    model TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    PRIMARY KEY (model, chunk_hash)
+                );
+            """)
+            conn.execute("INSERT OR IGNORE INTO models (model, dim, row_count) VALUES (?, ?, 0)", (model_key, dim))
+            (stored_dim,) = conn.execute("SELECT dim FROM models WHERE model = ?", (model_key,)).fetchone()
+        if stored_dim != dim:
+            raise ValueError(f"Cached {model_key} vectors have dimension {stored_dim}, not {dim}")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, chunk_hashes):
+        """
+        Cached vectors for the given chunk hashes.
+
+        Returns:
+            dict: chunk_hash -> float32 vector, for the hashes that are cached
+        """
+        chunk_hashes = list(set(chunk_hashes))
+        rows = {}
+        with self._connect() as conn:
+            for start in range(0, len(chunk_hashes), _LOOKUP_BATCH):
+                batch = chunk_hashes[start:start + _LOOKUP_BATCH]
+                rows.update(conn.execute(
+                    f"SELECT chunk_hash, row FROM vectors WHERE model = ? "
+                    f"AND chunk_hash IN ({','.join('?' * len(batch))})",
+                    (self.model_key, *batch),
+                ))
+        if not rows:
+            return {}
+
+        vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r").reshape(-1, self.dim)
+        order = list(rows)
+        found = vectors[[rows[h] for h in order]].astype(np.float32)
+        return dict(zip(order, found))
+
+    def put(self, items):
+        """Store vectors, given a chunk_hash -> vector mapping"""
+        if not items:
+            return
+        with self._lock, self._connect() as conn:
+            # Take the write lock before allocating rows
+            conn.execute("BEGIN IMMEDIATE")
+            existing = set()
+            hashes = list(items)
+            for start in range(0, len(hashes), _LOOKUP_BATCH):
+                batch = hashes[start:start + _LOOKUP_BATCH]
+                existing.update(h for (h,) in conn.execute(
+                    f"SELECT chunk_hash FROM vectors WHERE model = ? "
+                    f"AND chunk_hash IN ({','.join('?' * len(batch))})",
+                    (self.model_key, *batch),
+                ))
+            new = [h for h in hashes if h not in existing]
+            if not new:
+                return
+
+            (row_count,) = conn.execute(
+                "SELECT row_count FROM models WHERE model = ?", (self.model_key,)
+            ).fetchone()
+            self._ensure_capacity(row_count + len(new))
+            vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r+").reshape(-1, self.dim)
+            vectors[row_count:row_count + len(new)] = np.asarray([items[h] for h in new], dtype=np.float16)
+            vectors.flush()
+            del vectors
+
+            # Rows become visible only once their vectors are on disk
+            conn.executemany(
+                "INSERT INTO vectors (model, chunk_hash, row) VALUES (?, ?, ?)",
+                [(self.model_key, h, row_count + i) for i, h in enumerate(new)],
+            )
+            conn.execute(
+                "UPDATE models SET row_count = ? WHERE model = ?", (row_count + len(new), self.model_key)
+            )
+
+    def _ensure_capacity(self, rows):
+        """Grow the vector file (doubling) so it holds at least `rows` rows"""
+        row_bytes = 2 * self.dim
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if size >= rows * row_bytes:
+            return
+        capacity = max(rows, 2 * (size // row_bytes), 1024)
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * row_bytes)
+
+
+class EmbeddingService(Embeddings):
+    """
+    Sentence-transformer embeddings with batching, threads and a cache.
+
+    A drop-in LangChain `Embeddings`. Documents are first looked up in the
+    chunk-embedding cache; the misses are sorted by length (so each batch
+    pads to similar lengths), split into batches and encoded across a
+    thread pool. Torch's intra-op threads are split between the workers.
+
+    Args:
+        model_name (str): sentence-transformers model
+        batch_size (int): Chunks per encode call
+        workers (int): Batches encoded concurrently
+        normalize (bool): L2-normalize vectors (makes L2 search rank by
+            cosine similarity)
+        cache_dir (str or None): Embedding cache location; None disables it
+        device (str or None): Torch device (default: sentence-transformers' choice)
+    """
+
+    def __init__(self, model_name, batch_size=32, workers=2, normalize=False, cache_dir=DEFAULT_CACHE_DIR,
+                 device=None):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.cache = EmbeddingCache(cache_dir, self.key, self.dim) if cache_dir else None
+
+        if workers > 1:
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+
+        self.encoded = 0
+        self.cache_hits = 0
+        self.encode_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    @property
+    def key(self):
+        """Identifies the vectors this service produces"""
+        return f"{self.model_name}|normalized" if self.normalize else self.model_name
+
+    def _encode(self, texts):
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get(hashes) if self.cache is not None else {}
+
+        missing = {}
+        for chunk_hash, text in zip(hashes, texts):
+            if chunk_hash not in vectors:
+                missing.setdefault(chunk_hash, text)
+
+        if missing:
+            start = time.perf_counter()
+            ordered = sorted(missing.items(), key=lambda item: len(item[1]), reverse=True)
+            batches = [ordered[i:i + self.batch_size] for i in range(0, len(ordered), self.batch_size)]
+            encoded = self._pool.map(lambda batch: self._encode([text for _, text in batch]), batches)
+            computed = {}
+            for batch, batch_vectors in zip(batches, encoded):
+                computed.update(zip((chunk_hash for chunk_hash, _ in batch), batch_vectors))
+            elapsed = time.perf_counter() - start
+
+            if self.cache is not None:
+                self.cache.put(computed)
+            vectors.update(computed)
+            with self._stats_lock:
+                self.encoded += len(computed)
+                self.encode_seconds += elapsed
+
+        with self._stats_lock:
+            self.cache_hits += len(texts) - len(missing)
+        return [np.asarray(vectors[chunk_hash], dtype=np.float32).tolist() for chunk_hash in hashes]
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+    def stats(self):
+        """Encoding throughput and cache hits for this process"""
+        with self._stats_lock:
+            total = self.encoded + self.cache_hits
+            return {
+                "encoded": self.encoded,
+                "cache_hits": self.cache_hits,
+                "hit_rate": self.cache_hits / total if total else 0.0,
+                "chunks_per_sec": self.encoded / self.encode_seconds if self.encode_seconds else 0.0,
+            }
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embeddings(model_name=DEFAULT_EMBEDDING_MODEL):
+    """The embedding service for a model, constructed once per process"""
+    with _services_lock:
+        if model_name not in _services:
+            _services[model_name] = EmbeddingService(model_name)
+        return _services[model_name]
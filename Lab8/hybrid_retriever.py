@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+# Dense and keyword searches of one query run side by side
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse ranked lists with reciprocal-rank fusion.
+
+    Each item scores sum(1 / (k + rank)) over the lists it appears in
+    (rank starting at 1), so items ranked well by either retriever rise
+    without having to calibrate BM25 scores against vector distances.
+
+    Parameters:
+        rankings (list[list]): Ranked item ids, best first.
+        k (int): Damping constant; larger values flatten the rank weights.
+
+    Returns:
+        list[tuple]: (item id, fused score), best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (FAISS) plus keyword (BM25) retrieval over a KnowledgeBase.
+
+    Both searches run concurrently, each returning `candidates` chunks;
+    the lists are merged with reciprocal-rank fusion and the top `k` go to
+    the chain. BM25 catches exact identifiers and part numbers that
+    embeddings blur, which lets the "stuff" prompt carry fewer chunks.
+    """
+
+    knowledge_base: Any
+    k: int = 3
+    candidates: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun):
+        dense = _executor.submit(self.knowledge_base.search, query, self.candidates)
+        keyword = _executor.submit(self.knowledge_base.keyword_search, query, self.candidates)
+        dense_docs, keyword_docs = dense.result(), keyword.result()
+
+        documents = {}
+        rankings = []
+        for docs in (dense_docs, keyword_docs):
+            ranking = []
+            for doc in docs:
+                chunk_id = doc.metadata["chunk_id"]
+                documents.setdefault(chunk_id, doc)
+                ranking.append(chunk_id)
+            rankings.append(ranking)
+
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        return [documents[chunk_id] for chunk_id, _ in fused[:self.k]]
@@ -0,0 +1,651 @@
+import base64
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import Counter
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain.text_splitter import CharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from ann_index import (
+    INDEX_TYPES, build_index, index_type_of, min_vectors, reconstruct_all, set_search_params
+)
+from bm25 import BM25Index
+from embedding_service import DEFAULT_EMBEDDING_MODEL, get_embeddings, text_hash
+from hybrid_retriever import HybridRetriever
+
+DEFAULT_KB_DIR = os.environ.get(
+    "LAB8_KB_DIR", os.path.join(os.path.expanduser("~"), ".cache", "lab8", "knowledge_base")
+)
+TEXT_EXTENSIONS = (".txt", ".md")
+# Append-only change log kept next to each snapshot
+LOG_NAME = "log.jsonl"
+# Index settings used when neither the caller nor the knowledge base has any
+DEFAULT_INDEX_SETTINGS = {"index_type": "flat", "nprobe": 16, "ef_search": 64}
+
+
+def split_text(text, chunk_size=1000, chunk_overlap=100):
+    """Split a document into chunks for indexing"""
+    splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_documents([Document(page_content=text)])
+
+
+def read_index(path):
+    """
+    Read a FAISS index memory-mapped, so pages load on demand and are shared
+    between processes; index types without mmap support are read normally.
+    """
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+class KnowledgeBase:
+    """
+    A FAISS vector store that grows and shrinks one document at a time.
+
+    Every chunk is identified by the hash of its text, so a chunk shared by
+    several documents (or re-ingested unchanged) is embedded once. Ingesting
+    a document embeds only the chunks the store does not have yet, in
+    batches; the chunks it no longer contains are deleted once no other
+    document uses them.
+
+    Live chunks are also kept in an incremental BM25 index for exact-term
+    (identifier, part number) matches; see HybridRetriever.
+
+    Every change is appended to a log next to the current snapshot (new
+    chunks with their vectors, document updates and removals, index
+    settings), so saving costs one small write and a restart replays the
+    log. Deletes are cheap: chunks are tombstoned and filtered out of
+    searches immediately. Once enough tombstones or log records pile up, a
+    background thread compacts: it rebuilds the index without the
+    tombstones and writes a new snapshot from a copy, outside the lock, then
+    swaps it in and starts a new log.
+
+    The snapshot's index is memory-mapped when loaded. A mapped index is
+    read-only, so the first chunk added copies it into memory; until then
+    (and in read-only mode, unless the log has additions) searches read it
+    straight from the page cache.
+
+    Args:
+        kb_dir (str): Where snapshots are saved
+        embedding_model (str): HuggingFace sentence-embedding model
+        chunk_size (int): Characters per chunk
+        chunk_overlap (int): Characters shared by neighbouring chunks
+        batch_size (int): Chunks handed to the embedding service at a time
+            (it splits them further across its workers)
+        compact_after (int): Tombstones that trigger a compaction
+        compact_log_mb (float): Log size that triggers a compaction
+        save_delay (float): Seconds of quiet before a due compaction runs
+        index_type (str): 'flat' (exact), 'ivf_flat', 'hnsw' or 'ivf_pq'
+            (see ann_index). IVF indexes stay flat until there are enough
+            vectors to train them. Index settings are saved with the
+            knowledge base; None keeps the saved one (default 'flat')
+        nprobe (int): IVF cells searched per query (saved; default 16)
+        ef_search (int): HNSW candidate list size per query (saved; default 64)
+        read_only (bool): Only load and search: no compaction thread, no
+            index rebuild and nothing written to `kb_dir`
+    """
+
+    def __init__(self, kb_dir=DEFAULT_KB_DIR, embedding_model=DEFAULT_EMBEDDING_MODEL, chunk_size=1000,
+                 chunk_overlap=100, batch_size=256, compact_after=1000, compact_log_mb=64, save_delay=5.0,
+                 index_type=None, nprobe=None, ef_search=None, read_only=False):
+        if index_type is not None and index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        self.kb_dir = kb_dir
+        self.embedding_model = embedding_model
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.compact_after = compact_after
+        self.compact_log_bytes = int(compact_log_mb * 1024 ** 2)
+        self.save_delay = save_delay
+        self.read_only = read_only
+        # None until _load resolves them against the saved settings
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+
+        self.store = None
+        # source name -> {'hash': document text hash, 'chunks': [chunk ids]}
+        self.sources = {}
+        self.tombstones = set()
+        self._indexed = set()
+        self.bm25 = BM25Index()
+        self._refcounts = Counter()
+        # Open change logs: the current snapshot's, plus the next one's during a compaction
+        self._logs = []
+        self._log_bytes = 0
+        self._rebuilt = False
+        # (index, path) while the store's index is the memory-mapped snapshot
+        self._mapped = None
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._changed = threading.Event()
+
+        if read_only:
+            self._load()
+            return
+        os.makedirs(kb_dir, exist_ok=True)
+        self._load()
+        threading.Thread(target=self._compact_loop, daemon=True).start()
+
+    @property
+    def embeddings(self):
+        return get_embeddings(self.embedding_model)
+
+    # --- Ingestion ---
+
+    def add_text(self, source, text):
+        """
+        Add or update one document.
+
+        Returns:
+            dict: {'added': chunks embedded, 'reused': chunks already indexed,
+            'removed': chunks no longer used}
+        """
+        self._check_writable()
+        document_hash = text_hash(text)
+        with self._lock:
+            old = self.sources.get(source)
+            if old is not None and old["hash"] == document_hash:
+                return {"added": 0, "reused": len(old["chunks"]), "removed": 0}
+
+        chunks = {}
+        for doc in split_text(text, self.chunk_size, self.chunk_overlap):
+            chunks.setdefault(text_hash(doc.page_content), doc.page_content)
+
+        with self._lock:
+            # Reference the chunks right away so a concurrent delete cannot tombstone them
+            self._refcounts.update(list(chunks))
+            # A tombstoned chunk that comes back is simply revived
+            for chunk_id in self.tombstones & set(chunks):
+                self.tombstones.discard(chunk_id)
+                self.bm25.add(chunk_id, chunks[chunk_id])
+            known = {chunk_id for chunk_id in chunks if chunk_id in self._indexed}
+        new = [(chunk_id, content) for chunk_id, content in chunks.items() if chunk_id not in known]
+
+        # Embedding is the slow part; it runs without holding the lock
+        try:
+            for start in range(0, len(new), self.batch_size):
+                batch = new[start:start + self.batch_size]
+                vectors = self.embeddings.embed_documents([content for _, content in batch])
+                with self._lock:
+                    self._add_vectors(batch, vectors, source)
+        except Exception:
+            with self._lock:
+                # Chunks embedded before the failure are tombstoned; the rest were never indexed
+                self._release(chunks)
+                self._changed.set()
+            raise
+
+        with self._lock:
+            old = self.sources.get(source)
+            self.sources[source] = {"hash": document_hash, "chunks": list(chunks)}
+            removed = self._release(old["chunks"]) if old is not None else 0
+            self._log({"op": "set", "source": source, **self.sources[source]})
+        return {"added": len(new), "reused": len(known), "removed": removed}
+
+    def add_path(self, path, prune=False):
+        """
+        Ingest a text file, or every text file under a directory.
+
+        Args:
+            prune (bool): Also remove documents previously ingested from
+                under `path` whose files no longer exist
+
+        Returns:
+            dict: source -> add_text result
+        """
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+                if name.lower().endswith(TEXT_EXTENSIONS)
+            )
+
+        results = {}
+        for file_path in files:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                results[file_path] = self.add_text(file_path, f.read())
+
+        if prune and os.path.isdir(path):
+            prefix = path.rstrip(os.sep) + os.sep
+            for source in [s for s in self.list_sources() if s.startswith(prefix) and s not in results]:
+                self.remove(source)
+        return results
+
+    def remove(self, source):
+        """Delete a document; returns the number of chunks no longer used by any document"""
+        self._check_writable()
+        with self._lock:
+            old = self.sources.pop(source, None)
+            if old is None:
+                return 0
+            removed = self._release(old["chunks"])
+            self._log({"op": "remove", "source": source})
+            return removed
+
+    def list_sources(self):
+        with self._lock:
+            return list(self.sources)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "documents": len(self.sources),
+                "chunks": len(self._refcounts),
+                "vectors": self.store.index.ntotal if self.store is not None else 0,
+                "tombstones": len(self.tombstones),
+                "log_mb": round(self._log_bytes / 1024 ** 2, 2),
+                "index_type": index_type_of(self.store.index) if self.store is not None else self.index_type,
+            }
+
+    def set_index_type(self, index_type, nprobe=None, ef_search=None):
+        """
+        Switch index mode and/or search effort; the index is rebuilt if the
+        mode changes. The settings are logged, so they survive a restart.
+        """
+        self._check_writable()
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        with self._lock:
+            old = self._index_settings()
+            self.index_type = index_type
+            self.nprobe = nprobe or self.nprobe
+            self.ef_search = ef_search or self.ef_search
+            if self._index_settings() != old:
+                self._log({"op": "index", **self._index_settings()})
+            self._apply_index_type()
+
+    def _index_settings(self):
+        return {"index_type": self.index_type, "nprobe": self.nprobe, "ef_search": self.ef_search}
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"{self.kb_dir} was opened read-only")
+
+    def _add_vectors(self, batch, vectors, source):
+        # A concurrent ingest may have added the same chunk meanwhile
+        pairs = [(item, vector) for item, vector in zip(batch, vectors) if item[0] not in self._indexed]
+        if not pairs:
+            return
+        ids = [chunk_id for (chunk_id, _), _ in pairs]
+        texts = [content for (_, content), _ in pairs]
+        vectors = np.asarray([vector for _, vector in pairs], dtype=np.float32)
+        metadatas = [{"chunk_id": chunk_id, "source": source} for chunk_id in ids]
+        self.store = self._store_add(self.store, ids, texts, vectors, metadatas)
+        self._log(self._add_record(ids, texts, vectors, metadatas))
+        self._indexed.update(ids)
+        for chunk_id, content in zip(ids, texts):
+            self.bm25.add(chunk_id, content)
+        self._apply_index_type()
+
+    def _store_add(self, store, ids, texts, vectors, metadatas):
+        """Add vectors to `store`, creating it if it is None; returns the store"""
+        texts_and_vectors = list(zip(texts, vectors))
+        if store is None:
+            return FAISS.from_embeddings(texts_and_vectors, self.embeddings, metadatas=metadatas, ids=ids)
+        if self._mapped is not None and store.index is self._mapped[0]:
+            # Copy the mapped snapshot into memory before the first write
+            store.index = faiss.read_index(self._mapped[1])
+            set_search_params(store.index, nprobe=self.nprobe, ef_search=self.ef_search)
+            self._mapped = None
+        store.add_embeddings(texts_and_vectors, metadatas=metadatas, ids=ids)
+        return store
+
+    def _apply_index_type(self):
+        """Rebuild the index as `index_type` once there are enough vectors to train it"""
+        if self.store is None:
+            return
+        index = self.store.index
+        if index_type_of(index) != self.index_type and index.ntotal >= min_vectors(self.index_type):
+            ids = [self.store.index_to_docstore_id[i] for i in range(index.ntotal)]
+            self.store.index = build_index(self._vectors(ids), self.index_type)
+            self._mapped = None
+            # Worth a new snapshot, or the next start rebuilds it again
+            self._rebuilt = True
+            self._changed.set()
+        set_search_params(self.store.index, nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def _vectors(self, ids, index=None, positions=None):
+        """
+        Vectors of indexed chunks, in the order of `ids`.
+
+        Taken from the embedding cache when it has them all (IVF-PQ only
+        keeps approximations), otherwise reconstructed from `index` (default:
+        the store's), where chunk id -> row is given by `positions`.
+        """
+        cache = getattr(self.embeddings, "cache", None)
+        if cache is not None:
+            cached = cache.get(ids)
+            if len(cached) == len(set(ids)):
+                return np.stack([cached[chunk_id] for chunk_id in ids]).astype(np.float32)
+        if index is None:
+            index = self.store.index
+            positions = {chunk_id: i for i, chunk_id in self.store.index_to_docstore_id.items()}
+        return reconstruct_all(index)[[positions[chunk_id] for chunk_id in ids]]
+
+    def _release(self, chunk_ids):
+        """
+        Drop one reference to each chunk; unreferenced chunks that are in
+        the index are tombstoned (others, e.g. from a failed ingest, were
+        never added and are just forgotten)
+        """
+        removed = 0
+        for chunk_id in chunk_ids:
+            self._refcounts[chunk_id] -= 1
+            if self._refcounts[chunk_id] <= 0:
+                del self._refcounts[chunk_id]
+                if chunk_id in self._indexed:
+                    self.tombstones.add(chunk_id)
+                    self.bm25.remove(chunk_id)
+                    removed += 1
+        return removed
+
+    def _add_record(self, ids, texts, vectors, metadatas):
+        return {
+            "op": "add",
+            "ids": ids,
+            "texts": texts,
+            "metadatas": metadatas,
+            "vectors": base64.b64encode(np.ascontiguousarray(vectors, dtype=np.float32).tobytes()).decode("ascii"),
+        }
+
+    def _log(self, record):
+        """Append a change to the open logs (flushed, so it survives a crash of this process)"""
+        line = json.dumps(record) + "\n"
+        for log in self._logs:
+            log.write(line)
+            log.flush()
+        self._log_bytes += len(line)
+        self._changed.set()
+
+    # --- Search ---
+
+    def search(self, query, k=3):
+        """The k most similar live chunks"""
+        vector = self.embeddings.embed_query(query)
+        with self._lock:
+            if self.store is None:
+                return []
+            tombstones = set(self.tombstones)
+            return self.store.similarity_search_by_vector(
+                vector,
+                k=k,
+                fetch_k=k + len(tombstones),
+                filter=lambda metadata: metadata["chunk_id"] not in tombstones,
+            )
+
+    def keyword_search(self, query, k=3):
+        """The k best live chunks by BM25"""
+        hits = self.bm25.search(query, k=k)
+        with self._lock:
+            if self.store is None:
+                return []
+            return [self.store.docstore.search(chunk_id) for chunk_id, _ in hits if chunk_id in self._indexed]
+
+    def as_retriever(self, k=3, hybrid=False):
+        """LangChain retriever: dense only, or fused with BM25 when `hybrid`"""
+        if hybrid:
+            return HybridRetriever(knowledge_base=self, k=k)
+        return KnowledgeBaseRetriever(knowledge_base=self, k=k)
+
+    # --- Persistence and compaction ---
+
+    def _current_path(self):
+        return os.path.join(self.kb_dir, "CURRENT")
+
+    def _snapshot_path(self, name):
+        return os.path.join(self.kb_dir, name)
+
+    def _load(self):
+        requested = self._index_settings()
+        try:
+            with open(self._current_path()) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            self._resolve_index_settings(requested, {})
+            if self.read_only:
+                return
+            # Start from an empty snapshot, so there is always a log to append to
+            name = f"snapshot-{time.time_ns()}"
+            os.makedirs(self._snapshot_path(name))
+            self._write_manifest(self._snapshot_path(name), {}, self._index_settings())
+            self._switch_current(name)
+        snapshot = self._snapshot_path(name)
+
+        with open(os.path.join(snapshot, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest["embedding_model"] != self.embedding_model:
+            raise ValueError(
+                f"{self.kb_dir} was built with {manifest['embedding_model']}, not {self.embedding_model}"
+            )
+        self.sources = manifest["sources"]
+        # Snapshots written before the settings were saved have none
+        saved = {key: manifest[key] for key in DEFAULT_INDEX_SETTINGS if key in manifest}
+        if os.path.exists(os.path.join(snapshot, "index.faiss")):
+            self.store = self._load_store(snapshot)
+            self._indexed = set(self.store.index_to_docstore_id.values())
+        self._replay(os.path.join(snapshot, LOG_NAME), saved)
+        self._resolve_index_settings(requested, saved)
+
+        self._refcounts = Counter(chunk_id for info in self.sources.values() for chunk_id in info["chunks"])
+        # Chunks that lost their last document before the last change was logged
+        self.tombstones = self._indexed - set(self._refcounts)
+        for chunk_id in self._indexed - self.tombstones:
+            self.bm25.add(chunk_id, self.store.docstore.search(chunk_id).page_content)
+        if self.read_only:
+            if self.store is not None:
+                set_search_params(self.store.index, nprobe=self.nprobe, ef_search=self.ef_search)
+            return
+        self._logs = [open(os.path.join(snapshot, LOG_NAME), "a", encoding="utf-8")]
+        if self._index_settings() != {**DEFAULT_INDEX_SETTINGS, **saved}:
+            # Settings passed by the caller replace the saved ones
+            self._log({"op": "index", **self._index_settings()})
+        self._apply_index_type()
+
+    def _load_store(self, snapshot):
+        """The snapshot's store, its index memory-mapped"""
+        path = os.path.join(snapshot, "index.faiss")
+        index = read_index(path)
+        self._mapped = (index, path)
+        # Our own file, written by FAISS.save_local
+        with open(os.path.join(snapshot, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+
+    def _resolve_index_settings(self, requested, saved):
+        """Settings the caller passed win, then the saved ones, then the defaults"""
+        for key, default in DEFAULT_INDEX_SETTINGS.items():
+            value = requested[key] if requested[key] is not None else saved.get(key, default)
+            setattr(self, key, value)
+
+    def _replay(self, log_path, saved):
+        """Apply the changes logged since the snapshot was written; index settings go to `saved`"""
+        if not os.path.exists(log_path):
+            return
+        good = 0
+        with open(log_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the end of the log
+                good += len(line)
+                if record["op"] == "add":
+                    vectors = np.frombuffer(base64.b64decode(record["vectors"]), dtype=np.float32)
+                    vectors = vectors.reshape(len(record["ids"]), -1)
+                    new = [i for i, chunk_id in enumerate(record["ids"]) if chunk_id not in self._indexed]
+                    if new:
+                        self.store = self._store_add(
+                            self.store,
+                            [record["ids"][i] for i in new],
+                            [record["texts"][i] for i in new],
+                            vectors[new],
+                            [record["metadatas"][i] for i in new],
+                        )
+                        self._indexed.update(record["ids"][i] for i in new)
+                elif record["op"] == "set":
+                    self.sources[record["source"]] = {"hash": record["hash"], "chunks": record["chunks"]}
+                elif record["op"] == "remove":
+                    self.sources.pop(record["source"], None)
+                elif record["op"] == "index":
+                    saved.update((key, record[key]) for key in DEFAULT_INDEX_SETTINGS)
+        if good < os.path.getsize(log_path) and not self.read_only:
+            with open(log_path, "r+b") as f:
+                f.truncate(good)
+        self._log_bytes = good
+
+    def _compaction_due(self):
+        with self._lock:
+            return (len(self.tombstones) >= self.compact_after or self._log_bytes >= self.compact_log_bytes
+                    or self._rebuilt)
+
+    def _compact_loop(self):
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            if not self._compaction_due():
+                continue
+            # Let bursts of changes (e.g. a directory ingest) settle first
+            while self._changed.wait(self.save_delay) and len(self.tombstones) < self.compact_after:
+                self._changed.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Knowledge base compaction failed: {e}")
+
+    def flush(self):
+        """
+        Compact now: drop tombstoned chunks from the index and write a new
+        snapshot. Not needed for durability (changes are logged as they
+        happen), only to reclaim space and shorten the log.
+        """
+        self._check_writable()
+        with self._compact_lock:
+            name = f"snapshot-{time.time_ns()}"
+            snapshot = self._snapshot_path(name)
+            os.makedirs(snapshot)
+
+            # Take a consistent copy; from here on changes are logged for the new snapshot too
+            with self._lock:
+                live, docs, index, positions = [], {}, None, {}
+                if self.store is not None:
+                    # A mapped index never changes (it is copied before any write)
+                    mapped = self._mapped is not None and self.store.index is self._mapped[0]
+                    index = self.store.index if mapped else faiss.clone_index(self.store.index)
+                    positions = {chunk_id: i for i, chunk_id in self.store.index_to_docstore_id.items()}
+                    live = [
+                        chunk_id for _, chunk_id in sorted(self.store.index_to_docstore_id.items())
+                        if chunk_id not in self.tombstones
+                    ]
+                    docs = {chunk_id: self.store.docstore.search(chunk_id) for chunk_id in live}
+                sources = {source: dict(info) for source, info in self.sources.items()}
+                settings = self._index_settings()
+                index_type = self.index_type
+                log = open(os.path.join(snapshot, LOG_NAME), "a", encoding="utf-8")
+                self._logs.append(log)
+                self._rebuilt = False
+
+            # Rebuild and save without blocking searches or ingestion
+            try:
+                store = None
+                if live:
+                    # IVF keeps ids stable on removal and HNSW cannot remove at all,
+                    # so every index type is rebuilt (and retrained) without the tombstones
+                    vectors = self._vectors(live, index, positions)
+                    store = FAISS(
+                        embedding_function=self.embeddings,
+                        index=build_index(vectors, index_type if len(live) >= min_vectors(index_type) else "flat"),
+                        docstore=InMemoryDocstore(docs),
+                        index_to_docstore_id=dict(enumerate(live)),
+                    )
+                    store.save_local(snapshot)
+                self._write_manifest(snapshot, sources, settings)
+            except Exception:
+                with self._lock:
+                    self._logs.remove(log)
+                log.close()
+                shutil.rmtree(snapshot, ignore_errors=True)
+                raise
+
+            with self._lock:
+                # Catch up with chunks that became live while the copy was rebuilt
+                built = set(live)
+                missing = [] if self.store is None else [
+                    chunk_id for _, chunk_id in sorted(self.store.index_to_docstore_id.items())
+                    if chunk_id not in built and chunk_id not in self.tombstones
+                ]
+                if missing:
+                    vectors = self._vectors(missing)
+                    found = [self.store.docstore.search(chunk_id) for chunk_id in missing]
+                    texts = [doc.page_content for doc in found]
+                    metadatas = [doc.metadata for doc in found]
+                    store = self._store_add(store, missing, texts, vectors, metadatas)
+                    # Chunks added since the copy are in the new log already; revived
+                    # tombstones are not, since they were never re-embedded
+                    revived = [i for i, chunk_id in enumerate(missing) if chunk_id in positions]
+                    if revived:
+                        record = self._add_record(
+                            [missing[i] for i in revived], [texts[i] for i in revived],
+                            vectors[revived], [metadatas[i] for i in revived],
+                        )
+                        log.write(json.dumps(record) + "\n")
+                        log.flush()
+                self.store, self._mapped = store, None
+                self._indexed = built | set(missing)
+                # Tombstoned since the copy: still in the new index
+                self.tombstones &= built
+                self._apply_index_type()
+
+                for old_log in self._logs:
+                    if old_log is not log:
+                        old_log.close()
+                self._logs = [log]
+                self._log_bytes = log.tell()
+                self._switch_current(name)
+
+            for entry in os.listdir(self.kb_dir):
+                if entry.startswith("snapshot-") and entry != name:
+                    shutil.rmtree(self._snapshot_path(entry), ignore_errors=True)
+
+    def _write_manifest(self, snapshot, sources, settings):
+        with open(os.path.join(snapshot, "manifest.json"), "w") as f:
+            json.dump({"embedding_model": self.embedding_model, "sources": sources, **settings}, f)
+
+    def _switch_current(self, name):
+        """Point CURRENT at a snapshot atomically"""
+        tmp = f"{self._current_path()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, self._current_path())
+
+
+class KnowledgeBaseRetriever(BaseRetriever):
+    """LangChain retriever over the live chunks of a KnowledgeBase"""
+
+    knowledge_base: KnowledgeBase
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun):
+        return self.knowledge_base.search(query, k=self.k)
@@ -0,0 +1,106 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import ingestion
+from ingestion import KnowledgeBase
+
+DOCUMENT = "alpha one\n\nbeta two\n\ngamma three"
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic 8-dimensional vectors; fails after `fail_after` embed_documents calls"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return (np.frombuffer(digest[:8], dtype=np.uint8) / 255.0).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("embedding backend unavailable")
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def make_knowledge_base(tmp_path, monkeypatch, embeddings, **kwargs):
+    monkeypatch.setattr(ingestion, "get_embeddings", lambda model_name: embeddings)
+    # One chunk per paragraph, one chunk per embedding batch
+    return KnowledgeBase(str(tmp_path), chunk_size=10, chunk_overlap=0, batch_size=1, save_delay=3600, **kwargs)
+
+
+def test_failed_ingest_only_tombstones_indexed_chunks(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings(fail_after=1)
+    knowledge_base = make_knowledge_base(tmp_path, monkeypatch, embeddings)
+
+    with pytest.raises(RuntimeError):
+        knowledge_base.add_text("doc", DOCUMENT)
+
+    # Only the first batch reached the index; it alone is tombstoned
+    assert knowledge_base.tombstones <= knowledge_base._indexed
+    assert len(knowledge_base.tombstones) == 1
+    assert knowledge_base.list_sources() == []
+
+    # Compaction must not try to delete chunks that were never indexed
+    knowledge_base.flush()
+    assert knowledge_base.stats()["vectors"] == 0
+    assert knowledge_base.search("alpha") == []
+
+    # A retry embeds every chunk and leaves nothing behind
+    embeddings.fail_after = None
+    result = knowledge_base.add_text("doc", DOCUMENT)
+    assert result["added"] == 3
+    knowledge_base.flush()
+    assert knowledge_base.stats()["vectors"] == 3
+    assert knowledge_base.stats()["tombstones"] == 0
+
+
+def test_logged_changes_survive_a_restart(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings()
+    knowledge_base = make_knowledge_base(tmp_path, monkeypatch, embeddings)
+    knowledge_base.add_text("doc", DOCUMENT)
+    knowledge_base.add_text("other", "delta four")
+    knowledge_base.remove("other")
+
+    # No compaction ran: the state comes back from the snapshot plus the log
+    reopened = make_knowledge_base(tmp_path, monkeypatch, embeddings)
+    assert reopened.list_sources() == ["doc"]
+    assert reopened.stats()["chunks"] == 3
+    assert reopened.stats()["tombstones"] == 1
+
+    reopened.flush()
+    assert reopened.stats()["vectors"] == 3
+    assert reopened.stats()["log_mb"] == 0
+    assert make_knowledge_base(tmp_path, monkeypatch, embeddings).stats()["vectors"] == 3
+
+
+def test_index_settings_survive_a_restart(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings()
+    knowledge_base = make_knowledge_base(tmp_path, monkeypatch, embeddings)
+    knowledge_base.add_text("doc", DOCUMENT)
+    knowledge_base.set_index_type("hnsw", ef_search=32)
+
+    # From the log, then from the manifest once compacted
+    reopened = make_knowledge_base(tmp_path, monkeypatch, embeddings)
+    assert (reopened.index_type, reopened.ef_search) == ("hnsw", 32)
+    reopened.flush()
+    reopened = make_knowledge_base(tmp_path, monkeypatch, embeddings)
+    assert (reopened.index_type, reopened.ef_search) == ("hnsw", 32)
+    assert reopened.stats()["index_type"] == "hnsw"
+    assert reopened.stats()["log_mb"] == 0
+
+    # A read-only load neither rebuilds nor writes anything
+    files = sorted(path.name for path in tmp_path.rglob("*"))
+    read_only = make_knowledge_base(tmp_path, monkeypatch, embeddings, index_type="flat", read_only=True)
+    assert read_only.stats()["index_type"] == "hnsw"
+    with pytest.raises(ValueError):
+        read_only.add_text("other", "delta four")
+    assert sorted(path.name for path in tmp_path.rglob("*")) == files